@@ -4,20 +4,30 @@ EasyDict API Service
 """
 
 import os
-import json
+import re
+import asyncio
+import fcntl
 import logging
 import zipfile
+import queue
+import sqlite3
+import stat
+import threading
 import time
+import hashlib
+from collections import OrderedDict
 from pathlib import Path
 from contextlib import asynccontextmanager
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterator
 from datetime import datetime
-from contextlib import contextmanager
+from urllib.parse import quote
+from contextlib import contextmanager, nullcontext
 
 import aiosqlite
+import orjson
 import zstandard as zstd
 from fastapi import FastAPI, HTTPException, Request, Query
-from fastapi.responses import JSONResponse, StreamingResponse, FileResponse, HTMLResponse
+from fastapi.responses import Response, ORJSONResponse, StreamingResponse, FileResponse, HTMLResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 
@@ -30,10 +40,25 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+# 是否输出 [PERF] 性能日志（DEBUG_PERF=1 时开启）
+DEBUG_PERF = os.getenv("DEBUG_PERF") == "1"
+
+_NOOP_TIMER = nullcontext()
+
+
 @contextmanager
+def _performance_timer(operation_name: str, log_level: int = logging.INFO):
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - start_time) * 1000
+        logger.log(log_level, f"[PERF] {operation_name}: {elapsed_ms:.2f}ms")
+
+
 def performance_timer(operation_name: str, log_level: int = logging.INFO):
     """
-    性能测量上下文管理器
+    性能测量上下文管理器（仅在 DEBUG_PERF=1 时计时，否则返回共享的空上下文）
 
     用法:
         with performance_timer("操作名称"):
@@ -42,12 +67,9 @@ def performance_timer(operation_name: str, log_level: int = logging.INFO):
     输出:
         [PERF] 操作名称: 123.45ms
     """
-    start_time = time.perf_counter()
-    try:
-        yield
-    finally:
-        elapsed_ms = (time.perf_counter() - start_time) * 1000
-        logger.log(log_level, f"[PERF] {operation_name}: {elapsed_ms:.2f}ms")
+    if not DEBUG_PERF:
+        return _NOOP_TIMER
+    return _performance_timer(operation_name, log_level)
 
 # 根数据目录（自动构建子目录路径）
 DATA_PATH = Path(os.getenv("DATA_PATH", "./easydict-data"))
@@ -56,24 +78,103 @@ DICTIONARIES_PATH = DATA_PATH / "dictionaries"
 # 辅助数据文件目录
 AUXILIARY_PATH = DATA_PATH / "auxiliary"
 CACHE_PATH = Path(os.getenv("CACHE_PATH", "/tmp/easydict-cache"))
-
-# 数据库连接缓存
-_db_connections: Dict[str, aiosqlite.Connection] = {}
-# Media 数据库连接缓存
-_media_db_connections: Dict[str, aiosqlite.Connection] = {}
+# 辅助目录的真实路径（启动时解析一次，用于 /auxi 的路径遍历检查）
+_AUX_ROOT = AUXILIARY_PATH.resolve()
+# 词典目录的真实路径（用于生成 X-Accel-Redirect 路径）
+_DICT_ROOT = DICTIONARIES_PATH.resolve()
+
+# 部署在 nginx 之后时（USE_X_ACCEL=1），磁盘上的文件通过 X-Accel-Redirect 交给 nginx 直接发送，
+# 需要 nginx 配置 /_internal/dictionaries/ 与 /_internal/auxiliary/ 两个 internal location
+USE_X_ACCEL = os.getenv("USE_X_ACCEL") == "1"
+
+# 每个词典的 dictionary.db 只读连接池的连接数上限（首次访问只打开 1 个，并发借用时按需增长）
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+
+# dictionary.db 只读连接池（每个词典一个队列，请求从中借出连接，用完归还）
+_db_pools: Dict[str, "DbPool"] = {}
+# 本 worker 上次看到的 dictionary.db 文件标识 (st_ino, st_mtime_ns)
+# user 服务通过 os.replace 替换文件，缓存清除通知只会到达其中一个 worker，
+# 其他 worker 靠每次请求一次 stat 发现文件已被替换，然后重建连接池和解压器缓存
+_dict_db_idents: Dict[str, tuple[int, int]] = {}
+# media.db 只读连接（线程本地，每个线程池线程每个词典一个同步 sqlite3 连接）
+# 格式: _media_db_local.conns = {dict_id: (media.db 的文件标识, sqlite3.Connection)}
+# 文件标识即 file_identity() 的 (st_ino, st_mtime_ns)，文件被替换后标识变化，线程关闭旧连接并重新打开
+_media_db_local = threading.local()
+# 连接池创建锁（每个数据库文件一个，避免并发请求重复建池）
+_db_pool_locks: Dict[str, asyncio.Lock] = {}
 # Zstd 解压器缓存（每个词典一个，从 config 表的 zstd_dict 加载）
 _zstd_decompressors: Dict[str, zstd.ZstdDecompressor] = {}
-
-# ZIP 文件对象缓存
-# 缓存打开的 ZipFile 对象，避免每次请求都重新打开 ZIP 文件
-_zip_file_cache: Dict[str, zipfile.ZipFile] = {}
-# ZIP 文件索引缓存
-# 格式: {zip_path: {request_path: actual_path_in_zip}}
-_zip_index_cache: Dict[str, Dict[str, str]] = {}
-# ZIP 文件修改时间缓存（用于检测文件更新）
-_zip_file_mtime_cache: Dict[str, float] = {}
-# ZIP 文件数量缓存（直接存储文件数量，O(1) 查询）
-_zip_file_count_cache: Dict[str, int] = {}
+# 批量下载用的 ZstdCompressor 空闲列表（压缩器不是线程安全的，每个响应独占一个，用完归还复用）
+_zstd_compressors: "queue.SimpleQueue[zstd.ZstdCompressor]" = queue.SimpleQueue()
+# Zstd 压缩字典缓存（None 表示该词典不使用字典），供线程池任务创建独立的解压器
+_zstd_dicts: Dict[str, Optional[zstd.ZstdCompressionDict]] = {}
+# 加载 zstd 字典时的按词典锁，避免并发冷启动重复查询
+_zstd_locks: Dict[str, asyncio.Lock] = {}
+
+# 词典媒体存储方式缓存（只记录使用 media.db 的词典）
+# 格式: {dict_id: True}，词典更新（invalidate_dict_cache）时清除
+_media_storage_cache: Dict[str, bool] = {}
+
+# 媒体文件内容 LRU 缓存的字节上限（每个 worker 进程一份）
+# 实际占用为 worker 数（$(nproc)，按宿主机核数计）× 此值，默认取 16MB 以适应容器 1G 内存限制
+MEDIA_CACHE_BYTES = int(os.getenv("MEDIA_CACHE_BYTES", str(16 * 1024 * 1024)))
+# 媒体文件内容 LRU 缓存
+# 格式: {(dict_id, media.db 的文件标识, table_name, name): (blob, etag)}，按最近使用排序，总大小不超过 MEDIA_CACHE_BYTES
+# 键中带文件标识：media.db 被替换后旧条目不再命中，只会被 LRU 淘汰
+_media_blob_cache: "OrderedDict[tuple, tuple[bytes, str]]" = OrderedDict()
+_media_blob_cache_bytes = 0
+
+# 正在从 media.db 读取的媒体文件（single-flight：同一文件的并发请求共享一次查询）
+# 格式: {(dict_id, media.db 的文件标识, table_name, name): asyncio.Task}
+_media_blob_inflight: Dict[tuple, asyncio.Task] = {}
+
+# 音频/图片响应的 Cache-Control（缓存30天）
+MEDIA_CACHE_CONTROL = "public, max-age=2592000"
+# 旧目录结构中的音频/图片文件响应头（常量，所有请求共用）
+_MEDIA_FILE_HEADERS = {"Cache-Control": MEDIA_CACHE_CONTROL}
+# 辅助文件响应头（缓存1天）
+_AUXILIARY_FILE_HEADERS = {"Cache-Control": "public, max-age=86400"}
+
+# 超过该大小的媒体文件不整体读入内存，用 sqlite3.Blob 按块流式输出（也不进入 LRU 缓存）
+MEDIA_STREAM_THRESHOLD = 1024 * 1024
+# 流式输出时每块读取的字节数
+MEDIA_STREAM_CHUNK_SIZE = 64 * 1024
+
+# Range 请求头（只支持单个区间）
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
+
+# 词典信息缓存
+# 格式: {dict_id: (相关文件的 mtime 元组, DictionaryInfo)}，任一 mtime 变化即重新计算
+_dict_info_cache: Dict[str, tuple[tuple, "DictionaryInfo"]] = {}
+
+# 只读连接（dictionary.db / media.db）的 PRAGMA
+# 64MB 页缓存 + 256MB 内存映射，临时表放内存；query_only 保证请求路径不会写库
+READ_PRAGMAS = """
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-65536;
+    PRAGMA mmap_size=268435456;
+    PRAGMA query_only=1;
+"""
+# media.db 只存音视频/图片 blob，体积远大于 dictionary.db，内存映射放大到 1GB，
+# blob 读取直接走映射的页缓存，不再经 SQLite 堆拷贝
+MEDIA_READ_PRAGMAS = READ_PRAGMAS + """
+    PRAGMA mmap_size=1073741824;
+"""
+# /dictionaries 并发获取词典信息的最大并发数
+DICT_INFO_CONCURRENCY = 8
+# /word 接口最多返回的词条数量（精确匹配 + 前缀匹配）
+WORD_QUERY_LIMIT = 50
+# 单条 IN (...) 查询的最大参数数量（旧版 SQLite 的 SQLITE_MAX_VARIABLE_NUMBER 为 999）
+SQLITE_IN_CHUNK_SIZE = 900
+# ZIP → media.db 迁移时每批写入的文件数量
+MIGRATION_BATCH_SIZE = 1000
+# media.db 写连接的 PRAGMA
+# 注意：不切换为 WAL 模式，media.db 会被客户端直接下载，journal 模式是持久写入文件头的
+MEDIA_WRITE_PRAGMAS = """
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-262144;
+"""
 
 # 确保缓存目录存在
 CACHE_PATH.mkdir(parents=True, exist_ok=True)
@@ -100,77 +201,49 @@ class DictionaryInfo(BaseModel):
     updated_at: Optional[str] = None
 
 
-async def preload_zip_indexes():
+async def migrate_pending_zips():
     """
-    预加载所有词典的 ZIP 文件索引
-
-    在应用启动时扫描所有词典目录，为每个存在的 audios.zip 和 images.zip
-    预构建索引并缓存。这样可以避免首次访问音频/图片文件时的延迟。
+    启动时把尚未迁移的 audios.zip / images.zip 迁移到 media.db
 
-    性能影响:
-    - 应用启动时间会增加（取决于 ZIP 文件大小和数量）
-    - 但首次访问音频/图片文件时从 2000ms 降到 <1ms
+    media.db 是媒体文件的唯一存储，请求路径不再读取 ZIP 文件。
+    已有 media.db 的词典直接跳过；迁移失败时不会留下 media.db，下次启动重试。
+    多个 worker 同时启动时，每个词典由 migrate_pending_zip 加锁保证只迁移一次。
     """
     if not DICTIONARIES_PATH.exists():
         logger.warning(f"Dictionaries path does not exist: {DICTIONARIES_PATH}")
         return
 
-    logger.info("=" * 60)
-    logger.info("开始预加载 ZIP 文件索引...")
-    logger.info("=" * 60)
-
-    preload_start = time.perf_counter()
-    total_indexes = 0
-    total_files = 0
-
-    try:
-        # 扫描所有词典目录
-        for dict_path in DICTIONARIES_PATH.iterdir():
-            if not dict_path.is_dir():
-                continue
+    dict_ids = [
+        dict_path.name
+        for dict_path in DICTIONARIES_PATH.iterdir()
+        if dict_path.is_dir()
+        and not (dict_path / "media.db").exists()
+        and ((dict_path / "audios.zip").exists() or (dict_path / "images.zip").exists())
+    ]
+    if not dict_ids:
+        return
 
-            dict_id = dict_path.name
-            logger.info(f"处理词典: {dict_id}")
+    logger.info(f"Migrating ZIP media to media.db for {len(dict_ids)} dictionaries: {dict_ids}")
+    with performance_timer("ZIP → media.db 迁移"):
+        await asyncio.gather(*(migrate_pending_zip(dict_id) for dict_id in dict_ids))
 
-            # 检查并预加载 audios.zip
-            audios_zip = dict_path / "audios.zip"
-            if audios_zip.exists():
-                try:
-                    logger.info(f"  - 预加载音频索引: {audios_zip.name}")
-                    index_start = time.perf_counter()
-                    zip_index = await get_zip_index(audios_zip)
-                    index_ms = (time.perf_counter() - index_start) * 1000
-                    total_indexes += 1
-                    total_files += len(zip_index)
-                    logger.info(f"    ✓ 完成 | 索引条目: {len(zip_index):,} | 耗时: {index_ms:.2f}ms")
-                except Exception as e:
-                    logger.error(f"    ✗ 失败: {e}")
 
-            # 检查并预加载 images.zip
-            images_zip = dict_path / "images.zip"
-            if images_zip.exists():
-                try:
-                    logger.info(f"  - 预加载图片索引: {images_zip.name}")
-                    index_start = time.perf_counter()
-                    zip_index = await get_zip_index(images_zip)
-                    index_ms = (time.perf_counter() - index_start) * 1000
-                    total_indexes += 1
-                    total_files += len(zip_index)
-                    logger.info(f"    ✓ 完成 | 索引条目: {len(zip_index):,} | 耗时: {index_ms:.2f}ms")
-                except Exception as e:
-                    logger.error(f"    ✗ 失败: {e}")
-
-    except Exception as e:
-        logger.error(f"预加载 ZIP 索引时出错: {e}")
-
-    total_ms = (time.perf_counter() - preload_start) * 1000
+async def migrate_pending_zip(dict_id: str) -> None:
+    """
+    持有词典目录下 media.db.lock 的排他锁迁移单个词典
 
-    logger.info("=" * 60)
-    logger.info(f"ZIP 索引预加载完成！")
-    logger.info(f"  - 预加载索引数: {total_indexes}")
-    logger.info(f"  - 总索引条目: {total_files:,}")
-    logger.info(f"  - 总耗时: {total_ms:.2f}ms ({total_ms/1000:.2f}秒)")
-    logger.info("=" * 60)
+    其他 worker 在锁上等待，拿到锁后发现 media.db 已存在即跳过。
+    """
+    dict_path = DICTIONARIES_PATH / dict_id
+    media_db_path = dict_path / "media.db"
+    with open(dict_path / "media.db.lock", "a") as lock_file:
+        # flock 会阻塞，放到线程池中等待；文件关闭时自动释放锁
+        await asyncio.to_thread(fcntl.flock, lock_file, fcntl.LOCK_EX)
+        if media_db_path.exists():
+            logger.info(f"media.db for '{dict_id}' already migrated by another worker")
+            return
+        if not await migrate_zip_to_media_db(dict_id):
+            logger.error(f"Failed to migrate ZIP media for '{dict_id}', will retry on next start")
 
 
 @asynccontextmanager
@@ -181,29 +254,17 @@ async def lifespan(app: FastAPI):
     logger.info(f"Auxiliary path: {AUXILIARY_PATH}")
     logger.info(f"Cache path: {CACHE_PATH}")
 
-    # 预加载所有 ZIP 文件索引
-    await preload_zip_indexes()
+    # 把遗留的 ZIP 媒体包迁移到 media.db
+    await migrate_pending_zips()
 
     yield
-    # 清理数据库连接
-    for conn in _db_connections.values():
-        await conn.close()
-    # 清理 media 数据库连接
-    for conn in _media_db_connections.values():
-        await conn.close()
-    # 关闭所有打开的 ZipFile 对象
-    for zf in _zip_file_cache.values():
-        try:
-            zf.close()
-        except Exception as e:
-            logger.warning(f"Failed to close ZipFile: {e}")
-    # 清理 ZIP 缓存
-    _zip_file_cache.clear()
-    _zip_index_cache.clear()
-    _zip_file_count_cache.clear()
-    _zip_file_mtime_cache.clear()
+    # 清理数据库连接池
+    for pool in _db_pools.values():
+        await close_db_pool(pool)
+    _db_pools.clear()
     # 清理 zstd 解压器缓存
     _zstd_decompressors.clear()
+    _zstd_dicts.clear()
     logger.info("EasyDict API Server stopped")
 
 
@@ -211,7 +272,8 @@ app = FastAPI(
     title="EasyDict API",
     description="词典查询和下载服务 API",
     version="2.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # 添加 CORS 中间件
@@ -224,65 +286,224 @@ app.add_middleware(
 )
 
 
-async def get_db_connection(dict_id: str) -> Optional[aiosqlite.Connection]:
-    """获取词典数据库连接（带缓存）"""
-    cache_key = dict_id
+class DbPool(asyncio.Queue):
+    """只读连接池：队列中是空闲连接，opened 记录已打开的连接数（含借出中的）"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.opened = 0
+
+
+async def open_read_connection(db_path: Path, pragmas: str = READ_PRAGMAS) -> aiosqlite.Connection:
+    """以只读模式打开 SQLite 数据库并应用读优化 PRAGMA"""
+    conn = await aiosqlite.connect(f"{db_path.resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        conn.row_factory = aiosqlite.Row
+        await conn.executescript(pragmas)
+    except Exception:
+        await conn.close()
+        raise
+    return conn
 
-    if cache_key in _db_connections:
-        return _db_connections[cache_key]
 
-    db_path = DICTIONARIES_PATH / dict_id / "dictionary.db"
+async def close_db_pool(pool: DbPool) -> None:
+    """关闭连接池中所有空闲连接（借出中的连接在归还时关闭）"""
+    while not pool.empty():
+        conn = pool.get_nowait()
+        if conn is None:
+            continue
+        try:
+            await conn.close()
+        except Exception as e:
+            logger.warning(f"Failed to close pooled connection: {e}")
+    # 放入 None 哨兵，唤醒仍在等待该连接池的请求，让它们改用新的连接池
+    pool.put_nowait(None)
+
+
+async def _get_pool(
+    pools: Dict[str, DbPool], dict_id: str, db_path: Path, pragmas: str
+) -> Optional[DbPool]:
+    """
+    获取数据库文件的只读连接池（首次访问时只打开 1 个连接）
+
+    每个连接最多占用 READ_PRAGMAS 的页缓存，/dictionaries 会为每本词典建池，
+    因此不预先打开 DB_POOL_SIZE 个连接，由 _acquire 在并发借用时再增加。
+    """
+    pool = pools.get(dict_id)
+    if pool is not None:
+        return pool
 
     if not db_path.exists():
         return None
 
+    async with _db_pool_locks.setdefault(str(db_path), asyncio.Lock()):
+        pool = pools.get(dict_id)
+        if pool is not None:
+            return pool
+
+        pool = DbPool()
+        try:
+            pool.put_nowait(await open_read_connection(db_path, pragmas))
+            pool.opened = 1
+        except Exception as e:
+            logger.error(f"Failed to connect to database {db_path}: {e}")
+            await close_db_pool(pool)
+            return None
+
+        pools[dict_id] = pool
+        return pool
+
+
+@asynccontextmanager
+async def _acquire(pools: Dict[str, DbPool], dict_id: str, db_path: Path, pragmas: str):
+    """
+    从连接池借出一个只读连接，数据库不存在或无法连接时得到 None
+
+    没有空闲连接且已打开的连接数未达到 DB_POOL_SIZE 时新开一个连接，否则等待归还。
+    """
+    while True:
+        pool = await _get_pool(pools, dict_id, db_path, pragmas)
+        if pool is None:
+            break
+        if pool.empty() and pool.opened < DB_POOL_SIZE:
+            pool.opened += 1
+            try:
+                conn = await open_read_connection(db_path, pragmas)
+                break
+            except Exception as e:
+                pool.opened -= 1
+                logger.warning(f"Failed to grow connection pool for {db_path}: {e}")
+        conn = await pool.get()
+        if conn is not None:
+            break
+        # 连接池已失效：把哨兵传给下一个等待者，然后重试
+        pool.put_nowait(None)
+
+    if pool is None:
+        yield None
+        return
+
     try:
-        conn = await aiosqlite.connect(str(db_path))
-        conn.row_factory = aiosqlite.Row
-        _db_connections[cache_key] = conn
-        return conn
-    except Exception as e:
-        logger.error(f"Failed to connect to database {db_path}: {e}")
+        yield conn
+    finally:
+        if pools.get(dict_id) is pool:
+            pool.put_nowait(conn)
+        else:
+            # 借出期间连接池已被清除（词典文件已更新），直接关闭
+            await conn.close()
+
+
+def file_identity(path: Path) -> Optional[tuple[int, int]]:
+    """返回文件的 (st_ino, st_mtime_ns)，文件被 os.replace 替换或原地修改后都会变化；文件不存在时返回 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
         return None
+    return st.st_ino, st.st_mtime_ns
 
 
+async def drop_dict_db_caches(dict_id: str) -> bool:
+    """
+    清除本 worker 中依赖 dictionary.db 内容的缓存（连接池、zstd 解压器、词典信息）
 
-async def get_media_db_connection(dict_id: str) -> Optional[aiosqlite.Connection]:
-    """获取 media.db 数据库连接（带缓存）"""
-    cache_key = f"media_{dict_id}"
+    Returns:
+        是否关闭了连接池
+    """
+    _zstd_decompressors.pop(dict_id, None)
+    _zstd_dicts.pop(dict_id, None)
+    _dict_info_cache.pop(dict_id, None)
+    pool = _db_pools.pop(dict_id, None)
+    if pool is None:
+        return False
+    await close_db_pool(pool)
+    return True
 
-    if cache_key in _media_db_connections:
-        return _media_db_connections[cache_key]
 
-    media_db_path = DICTIONARIES_PATH / dict_id / "media.db"
+async def refresh_dict_db_caches(dict_id: str) -> None:
+    """stat 一次 dictionary.db，文件与上次看到的不同（已被替换）时清除该词典的缓存"""
+    ident = file_identity(DICTIONARIES_PATH / dict_id / "dictionary.db")
+    known = _dict_db_idents.get(dict_id)
+    if ident == known:
+        return
+    if ident is None:
+        del _dict_db_idents[dict_id]
+    else:
+        _dict_db_idents[dict_id] = ident
+    if known is not None:
+        logger.info(f"dictionary.db for '{dict_id}' was replaced, rebuilding connection pool")
+        await drop_dict_db_caches(dict_id)
 
-    if not media_db_path.exists():
-        return None
 
+@asynccontextmanager
+async def acquire_db(dict_id: str):
+    """
+    从连接池借出一个 dictionary.db 只读连接（先检查文件是否已被替换）
+
+    用法:
+        async with acquire_db(dict_id) as conn:
+            if conn is None:
+                # 词典不存在或无法连接
+    """
+    await refresh_dict_db_caches(dict_id)
+    async with _acquire(_db_pools, dict_id, DICTIONARIES_PATH / dict_id / "dictionary.db", READ_PRAGMAS) as conn:
+        yield conn
+
+
+def get_media_connection(dict_id: str, ident: Optional[tuple[int, int]] = None) -> sqlite3.Connection:
+    """
+    获取当前线程的 media.db 只读连接（同步函数，在 asyncio.to_thread 中调用）
+
+    小查询直接用同步 sqlite3 执行，每个请求只有一次线程池往返，
+    避免 aiosqlite 每个操作（execute / fetchone / close）都经过一次队列转发。
+
+    以 immutable=1 打开：SQLite 不再加文件锁、不检查 journal / 数据是否变化。
+    这要求 media.db 永不原地修改——user 服务和启动时的 ZIP 迁移都先写临时文件再 os.replace 整体替换，
+    已打开的连接继续读取旧文件。每次调用比较文件标识（ident，调用方已 stat 过时直接传入），
+    标识变化说明文件已被替换，重新打开；不依赖只会到达单个 worker 的缓存清除通知。
+    """
+    conns = getattr(_media_db_local, "conns", None)
+    if conns is None:
+        conns = _media_db_local.conns = {}
+    media_db_path = DICTIONARIES_PATH / dict_id / "media.db"
+    if ident is None:
+        ident = file_identity(media_db_path)
+    cached = conns.get(dict_id)
+    if cached is not None:
+        if cached[0] == ident:
+            return cached[1]
+        # 词典已更新，关闭本线程持有的旧连接
+        del conns[dict_id]
+        cached[1].close()
+
+    conn = sqlite3.connect(
+        f"{media_db_path.resolve().as_uri()}?mode=ro&immutable=1", uri=True,
+        check_same_thread=False, isolation_level=None
+    )
     try:
-        conn = await aiosqlite.connect(str(media_db_path))
-        conn.row_factory = aiosqlite.Row
-        _media_db_connections[cache_key] = conn
-        return conn
-    except Exception as e:
-        logger.error(f"Failed to connect to media database {media_db_path}: {e}")
-        return None
+        conn.executescript(MEDIA_READ_PRAGMAS)
+    except Exception:
+        conn.close()
+        raise
+    conns[dict_id] = (ident, conn)
+    return conn
 
 
-async def create_media_db(dict_id: str) -> bool:
+async def create_media_db(dict_id: str, media_db_path: Path) -> bool:
     """
     创建 media.db 数据库和表结构
 
     Args:
         dict_id: 词典ID
+        media_db_path: 数据库文件路径（迁移时为临时文件）
 
     Returns:
         是否成功创建
     """
-    media_db_path = DICTIONARIES_PATH / dict_id / "media.db"
-
     try:
         async with aiosqlite.connect(str(media_db_path)) as conn:
+            # 新库使用 8KB 页：blob 跨越的溢出页更少（必须在建表前设置）
+            await conn.execute("PRAGMA page_size=8192")
+
             # 创建 audios 表
             await conn.execute("""
                 CREATE TABLE IF NOT EXISTS audios (
@@ -299,10 +520,6 @@ async def create_media_db(dict_id: str) -> bool:
                 )
             """)
 
-            # 创建索引以提高查询性能
-            await conn.execute("CREATE INDEX IF NOT EXISTS idx_audios_name ON audios(name)")
-            await conn.execute("CREATE INDEX IF NOT EXISTS idx_images_name ON images(name)")
-
             await conn.commit()
 
         logger.info(f"Created media.db for dictionary '{dict_id}'")
@@ -313,10 +530,61 @@ async def create_media_db(dict_id: str) -> bool:
         return False
 
 
+def _read_zip_batch(zf: zipfile.ZipFile, infos: List[zipfile.ZipInfo]) -> List[tuple[str, bytes]]:
+    """读取一批 ZIP 成员（同步函数，在线程池中执行解压）"""
+    # 只使用文件名，不包含路径
+    rows = []
+    for info in infos:
+        # 直接用 ZipInfo 打开，跳过按文件名查找中央目录
+        with zf.open(info) as f:
+            rows.append((info.filename.split('/')[-1], f.read()))
+    return rows
+
+
+async def migrate_zip_table(conn: aiosqlite.Connection, zip_path: Path, table_name: str) -> int:
+    """
+    将单个 ZIP 文件中的所有文件批量写入 media.db 的指定表
+
+    解压在线程池中进行，每 MIGRATION_BATCH_SIZE 个文件执行一次 executemany，
+    整个过程处于同一个事务中。
+
+    Args:
+        conn: media.db 写连接
+        zip_path: ZIP 文件路径
+        table_name: 表名 ('audios' 或 'images')
+
+    Returns:
+        迁移的文件数量
+    """
+    zf = await asyncio.to_thread(zipfile.ZipFile, zip_path, 'r')
+    try:
+        infos = [info for info in zf.infolist() if not info.is_dir()]
+        await conn.execute("BEGIN IMMEDIATE")
+        try:
+            for start in range(0, len(infos), MIGRATION_BATCH_SIZE):
+                rows = await asyncio.to_thread(
+                    _read_zip_batch, zf, infos[start:start + MIGRATION_BATCH_SIZE]
+                )
+                await conn.executemany(
+                    f"INSERT OR REPLACE INTO {table_name} (name, blob) VALUES (?, ?)",
+                    rows
+                )
+            await conn.commit()
+        except BaseException:
+            await conn.rollback()
+            raise
+    finally:
+        zf.close()
+    return len(infos)
+
+
 async def migrate_zip_to_media_db(dict_id: str) -> bool:
     """
     将 audios.zip 和 images.zip 中的文件迁移到 media.db
 
+    先写入临时文件，完成后 os.replace 为 media.db：其他 worker 以 immutable 方式打开 media.db，
+    不能让它们看到写了一半的文件。失败时删除临时文件。
+
     Args:
         dict_id: 词典ID
 
@@ -326,6 +594,8 @@ async def migrate_zip_to_media_db(dict_id: str) -> bool:
     dict_path = DICTIONARIES_PATH / dict_id
     audios_zip = dict_path / "audios.zip"
     images_zip = dict_path / "images.zip"
+    # 调用方持有 media.db.lock，固定的临时文件名不会冲突；上次中断残留的临时文件直接覆盖
+    tmp_path = dict_path / "media.db.migrating"
 
     # 检查是否有需要迁移的文件
     if not audios_zip.exists() and not images_zip.exists():
@@ -333,221 +603,305 @@ async def migrate_zip_to_media_db(dict_id: str) -> bool:
         return True
 
     try:
+        tmp_path.unlink(missing_ok=True)
         # 首先创建数据库
-        if not await create_media_db(dict_id):
+        if not await create_media_db(dict_id, tmp_path):
             logger.error(f"Failed to create media.db for {dict_id}")
             return False
 
-        # 获取数据库连接
-        conn = await get_media_db_connection(dict_id)
-        if not conn:
-            logger.error(f"Failed to connect to media.db for {dict_id}")
-            return False
+        # 迁移使用独立的写连接，不占用请求路径上缓存的读连接
+        async with aiosqlite.connect(str(tmp_path)) as conn:
+            await conn.executescript(MEDIA_WRITE_PRAGMAS)
 
-        # 迁移音频文件
-        if audios_zip.exists():
-            logger.info(f"Migrating audios.zip to media.db for '{dict_id}'")
-            try:
-                with zipfile.ZipFile(audios_zip, 'r') as zf:
-                    for file_info in zf.filelist:
-                        if file_info.is_dir():
-                            continue
-
-                        file_name = file_info.filename
-                        # 只使用文件名，不包含路径
-                        simple_name = file_name.split('/')[-1]
-
-                        # 读取文件内容
-                        file_data = zf.read(file_name)
-
-                        # 插入数据库
-                        await conn.execute(
-                            "INSERT OR REPLACE INTO audios (name, blob) VALUES (?, ?)",
-                            (simple_name, file_data)
-                        )
-
-                await conn.commit()
-                logger.info(f"Successfully migrated audios from '{dict_id}'")
-            except Exception as e:
-                logger.error(f"Failed to migrate audios for {dict_id}: {e}")
-                return False
-
-        # 迁移图片文件
-        if images_zip.exists():
-            logger.info(f"Migrating images.zip to media.db for '{dict_id}'")
-            try:
-                with zipfile.ZipFile(images_zip, 'r') as zf:
-                    for file_info in zf.filelist:
-                        if file_info.is_dir():
-                            continue
-
-                        file_name = file_info.filename
-                        # 只使用文件名，不包含路径
-                        simple_name = file_name.split('/')[-1]
-
-                        # 读取文件内容
-                        file_data = zf.read(file_name)
-
-                        # 插入数据库
-                        await conn.execute(
-                            "INSERT OR REPLACE INTO images (name, blob) VALUES (?, ?)",
-                            (simple_name, file_data)
-                        )
-
-                await conn.commit()
-                logger.info(f"Successfully migrated images from '{dict_id}'")
-            except Exception as e:
-                logger.error(f"Failed to migrate images for {dict_id}: {e}")
-                return False
+            for zip_path, table_name in ((audios_zip, "audios"), (images_zip, "images")):
+                if not zip_path.exists():
+                    continue
+                logger.info(f"Migrating {zip_path.name} to media.db for '{dict_id}'")
+                try:
+                    count = await migrate_zip_table(conn, zip_path, table_name)
+                    logger.info(f"Successfully migrated {count} {table_name} from '{dict_id}'")
+                except Exception as e:
+                    logger.error(f"Failed to migrate {table_name} for {dict_id}: {e}")
+                    return False
 
+        os.replace(tmp_path, dict_path / "media.db")
         logger.info(f"Successfully migrated media files for dictionary '{dict_id}'")
         return True
 
     except Exception as e:
         logger.error(f"Failed to migrate media files for {dict_id}: {e}")
         return False
+    finally:
+        tmp_path.unlink(missing_ok=True)
 
 
-async def count_files_in_media_db(dict_id: str, table_name: str) -> int:
+def _read_media_blob(
+    dict_id: str, ident: Optional[tuple[int, int]], table_name: str, name: str
+) -> Optional[tuple[int, Optional[bytes]]]:
+    """get_media_blob 的同步实现（在线程池中执行）"""
+    return get_media_connection(dict_id, ident).execute(
+        f"""
+        SELECT length(blob), CASE WHEN length(blob) <= ? THEN blob END
+        FROM {table_name} WHERE name = ?
+        """,
+        (MEDIA_STREAM_THRESHOLD, name)
+    ).fetchone()
+
+
+async def get_media_blob(
+    dict_id: str, table_name: str, name: str, ident: Optional[tuple[int, int]] = None
+) -> Optional[tuple[int, Optional[bytes]]]:
     """
-    统计 media.db 中的文件数量
+    从 media.db 读取单个媒体文件
+
+    一次查询同时取大小和内容；只有不超过 MEDIA_STREAM_THRESHOLD 的文件才取出内容，
+    大文件留给 iter_media_blob 增量读取（length() 不会把 blob 读入内存）。
 
     Args:
         dict_id: 词典ID
         table_name: 表名 ('audios' 或 'images')
+        name: 文件名
+        ident: 调用方已取得的 media.db 文件标识（None 时在线程中 stat）
 
     Returns:
-        文件数量
+        (文件大小, 文件内容或 None（大文件）)，不存在时返回 None
     """
-    conn = await get_media_db_connection(dict_id)
-    if not conn:
-        return 0
+    try:
+        return await asyncio.to_thread(_read_media_blob, dict_id, ident, table_name, name)
+    except sqlite3.Error as e:
+        logger.error(f"Failed to read media.db for {dict_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to connect to media database")
+
+
+def iter_media_blob(dict_id: str, table_name: str, name: str, size: int, start: int, end: int) -> Iterator[bytes]:
+    """
+    用 sqlite3.Blob 增量读取 media.db 中大文件的 [start, end] 区间（同步生成器）
 
+    StreamingResponse 在线程池中迭代，且同一响应可能在不同线程上推进，
+    因此每个响应使用独立的只读连接（check_same_thread=False），读完即关闭。
+
+    rowid 在这个连接上按文件名重新查询：查询大小的线程本地连接可能仍指向被替换前的 media.db，
+    其 rowid 在新文件中可能对应别的文件。大小与响应头不一致时（文件已被替换）不输出任何内容并中断响应。
+    """
+    media_db_path = DICTIONARIES_PATH / dict_id / "media.db"
+    conn = sqlite3.connect(
+        f"{media_db_path.resolve().as_uri()}?mode=ro&immutable=1", uri=True, check_same_thread=False
+    )
     try:
-        cursor = await conn.execute(f"SELECT COUNT(*) as count FROM {table_name}")
-        row = await cursor.fetchone()
-        return row[0] if row else 0
-    except Exception as e:
-        logger.error(f"Failed to count files in {table_name}: {e}")
-        return 0
+        row = conn.execute(f"SELECT rowid, length(blob) FROM {table_name} WHERE name = ?", (name,)).fetchone()
+        if row is None or row[1] != size:
+            raise RuntimeError(f"media.db for '{dict_id}' changed while serving {table_name}/{name}")
+        with conn.blobopen(table_name, "blob", row[0], readonly=True) as blob:
+            blob.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = blob.read(min(MEDIA_STREAM_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+    finally:
+        conn.close()
+
+
+def _media_blob_cache_put(key: tuple, value: tuple[bytes, str]) -> None:
+    """写入媒体 LRU 缓存，超出字节上限时淘汰最久未使用的条目"""
+    global _media_blob_cache_bytes
+    size = len(value[0])
+    if size > MEDIA_CACHE_BYTES or key in _media_blob_cache:
+        return
+    _media_blob_cache[key] = value
+    _media_blob_cache_bytes += size
+    while _media_blob_cache_bytes > MEDIA_CACHE_BYTES:
+        _, (evicted_blob, _) = _media_blob_cache.popitem(last=False)
+        _media_blob_cache_bytes -= len(evicted_blob)
+
+
+def _media_blob_cache_drop(dict_id: str) -> None:
+    """清除某个词典的所有媒体缓存条目"""
+    global _media_blob_cache_bytes
+    for key in [key for key in _media_blob_cache if key[0] == dict_id]:
+        _media_blob_cache_bytes -= len(_media_blob_cache.pop(key)[0])
 
 
-async def get_zip_index(zip_path: Path) -> Dict[str, str]:
+def parse_range_header(range_header: Optional[str], size: int) -> Optional[tuple[int, int]]:
     """
-    获取 ZIP 文件路径索引（带缓存）
+    解析单区间的 Range 请求头
 
-    构建 {请求路径: ZIP内实际路径} 的映射字典
-    例如: {'word.mp3': 'audios/word.mp3', 'word': 'audios/word.mp3'}
+    Returns:
+        (起始字节, 结束字节)（均包含）；没有或无法识别的 Range 返回 None（按完整响应处理）
 
-    性能优化:
-    - 首次调用: 打开 ZIP 文件，解析 central directory，构建索引，并保持 ZipFile 对象打开
-    - 后续调用: 直接使用已打开的 ZipFile 对象和缓存的索引，O(1) 查找
-    - 自动更新: 检测文件修改时间，变化时重新打开 ZIP 并重建索引
+    Raises:
+        HTTPException 416: 区间超出文件范围
+    """
+    if not range_header:
+        return None
+    match = _RANGE_RE.fullmatch(range_header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # bytes=-N：最后 N 个字节
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        if end and int(end) < int(start):
+            return None  # 语法无效的区间按规范忽略
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
 
-    Args:
-        zip_path: ZIP 文件路径
+
+def media_blob_response(request: Request, blob_data: bytes, etag: str, media_type: str, file_path: str) -> Response:
+    """构造媒体 blob 响应；If-None-Match 命中时返回 304，带 Range 时返回 206"""
+    headers = {
+        "Content-Disposition": f'inline; filename="{file_path}"',
+        "Cache-Control": MEDIA_CACHE_CONTROL,
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    byte_range = parse_range_header(request.headers.get("range"), len(blob_data))
+    if byte_range is not None:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(blob_data)}"
+        return Response(content=blob_data[start:end + 1], status_code=206, media_type=media_type, headers=headers)
+
+    # blob 已完整读入内存，一次性作为响应体发送，不再切块流式输出
+    return Response(content=blob_data, media_type=media_type, headers=headers)
+
+
+def get_media_storage(dict_id: str) -> Optional[bool]:
+    """
+    判断词典的媒体文件是否存放在 media.db 中（只缓存 True，避免每次请求都 stat）
+
+    False 不缓存：缓存清除通知只会到达其中一个 worker，词典后来上传 media.db 时，
+    其他 worker 缓存的 False 会一直指向不存在的 audios/images 目录。
 
     Returns:
-        路径映射字典 {request_path: actual_path_in_zip}
+        True 使用 media.db，False 使用旧的 audios/images 目录；词典不存在时返回 None
+    """
+    if dict_id in _media_storage_cache:
+        return True
+    dict_path = DICTIONARIES_PATH / dict_id
+    if not dict_path.is_dir():
+        return None
+    if not (dict_path / "media.db").exists():
+        return False
+    _media_storage_cache[dict_id] = True
+    return True
+
+
+def media_stream_response(
+    request: Request, dict_id: str, table_name: str, size: int, media_type: str, file_path: str
+) -> StreamingResponse:
+    """构造大文件的流式响应（支持 Range），内容由 iter_media_blob 增量读取"""
+    headers = {
+        "Content-Disposition": f'inline; filename="{file_path}"',
+        "Cache-Control": MEDIA_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+    status_code = 200
+    start, end = 0, size - 1
+    byte_range = parse_range_header(request.headers.get("range"), size)
+    if byte_range is not None:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        iter_media_blob(dict_id, table_name, file_path, size, start, end),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers
+    )
+
+
+async def serve_media_blob(
+    request: Request, dict_id: str, table_name: str, file_path: str, media_type: str
+) -> Optional[Response]:
     """
-    total_start = time.perf_counter()
+    从 media.db 返回媒体文件（带 LRU 缓存），文件不存在时返回 None
 
-    cache_key = str(zip_path)
+    媒体文件在 media.db 被替换前不会变化，缓存键带 media.db 的文件标识，命中缓存时只需一次 stat；
+    小文件整体读入并缓存，超过 MEDIA_STREAM_THRESHOLD 的大文件不缓存，按块流式输出。
+    """
+    ident = file_identity(DICTIONARIES_PATH / dict_id / "media.db")
+    if ident is None:
+        return None
+    key = (dict_id, ident, table_name, file_path)
+    cached = _media_blob_cache.get(key)
+    if cached is not None:
+        _media_blob_cache.move_to_end(key)
+        return media_blob_response(request, *cached, media_type, file_path)
+
+    task = _media_blob_inflight.get(key)
+    if task is None:
+        # 查询放在独立任务中执行，发起请求被取消时不影响其他等待者
+        task = asyncio.ensure_future(load_media_blob(key))
+        _media_blob_inflight[key] = task
+        task.add_done_callback(
+            lambda t: _media_blob_inflight.pop(key) if _media_blob_inflight.get(key) is t else None
+        )
+    result = await asyncio.shield(task)
+    if result is None:
+        return None
+    size, value = result
+    if value is None:
+        return media_stream_response(request, dict_id, table_name, size, media_type, file_path)
+    return media_blob_response(request, *value, media_type, file_path)
 
-    # 检查文件是否存在
-    with performance_timer(f"检查 ZIP 文件存在: {zip_path.name}"):
-        if not zip_path.exists():
-            raise HTTPException(status_code=404, detail=f"Zip file not found: {zip_path}")
 
-    # 获取当前文件修改时间
-    try:
-        with performance_timer(f"获取文件修改时间: {zip_path.name}"):
-            current_mtime = zip_path.stat().st_mtime
-    except Exception as e:
-        logger.error(f"Failed to get mtime for {zip_path}: {e}")
-        raise HTTPException(status_code=500, detail="Failed to access zip file")
-
-    # 检查缓存是否有效
-    cache_check_start = time.perf_counter()
-    if cache_key in _zip_file_cache:
-        if _zip_file_mtime_cache.get(cache_key) == current_mtime:
-            # 缓存命中，直接返回
-            cache_check_ms = (time.perf_counter() - cache_check_start) * 1000
-            logger.info(f"[PERF] ZIP 文件对象缓存命中: {cache_check_ms:.2f}ms")
-            logger.debug(f"ZIP file cache hit for {zip_path.name}")
-            return _zip_index_cache[cache_key]
-        else:
-            logger.info(f"ZIP file {zip_path.name} has been modified, reopening...")
-            # 关闭旧的 ZipFile
-            try:
-                _zip_file_cache[cache_key].close()
-            except Exception as e:
-                logger.warning(f"Failed to close cached ZipFile: {e}")
-            del _zip_file_cache[cache_key]
+async def load_media_blob(key: tuple) -> Optional[tuple[int, Optional[tuple[bytes, str]]]]:
+    """
+    读取媒体文件并计算 ETag，小文件写入 LRU 缓存
+
+    Returns:
+        (文件大小, (内容, ETag) 或 None（大文件）)，文件不存在时返回 None
+    """
+    dict_id, ident, table_name, name = key
+    result = await get_media_blob(dict_id, table_name, name, ident)
+    if result is None:
+        return None
+    size, blob_data = result
+    if blob_data is None:
+        return size, None
 
-    # 缓存未命中或文件已更新，重新打开 ZIP 并构建索引
-    logger.info(f"Opening ZIP file and building index for {zip_path.name}...")
+    value = (blob_data, f'"{hashlib.sha1(blob_data).hexdigest()}"')
+    _media_blob_cache_put(key, value)
+    return size, value
 
-    index = {}  # {请求路径: 实际路径}
-    file_count = 0  # 实际文件数量（排除目录）
 
+def _count_media_rows(dict_id: str, table_name: str) -> int:
+    """count_files_in_media_db 的同步实现（在线程池中执行）"""
+    row = get_media_connection(dict_id).execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()
+    return row[0] if row else 0
+
+
+async def count_files_in_media_db(dict_id: str, table_name: str) -> int:
+    """
+    统计 media.db 中的文件数量
+
+    Args:
+        dict_id: 词典ID
+        table_name: 表名 ('audios' 或 'images')
+
+    Returns:
+        文件数量
+    """
     try:
-        with performance_timer(f"打开并解析 ZIP 文件: {zip_path.name}"):
-            # 打开 ZIP 文件并保持打开状态
-            zf = zipfile.ZipFile(zip_path, 'r')
-
-            with performance_timer(f"遍历 ZIP 文件列表"):
-                namelist = zf.namelist()
-
-            with performance_timer(f"构建索引映射 ({len(namelist)} 个文件)"):
-                # 遍历 ZIP 中的所有文件
-                for name in namelist:
-                    if name.endswith('/'):  # 跳过目录项
-                        continue
-
-                    # 统计实际文件数量
-                    file_count += 1
-
-                    # 为每个文件创建多个访问路径的映射
-                    # 这样无论客户端请求什么路径格式都能找到
-
-                    # 1. 完整路径映射
-                    index[name] = name
-
-                    # 2. 只有文件名的映射（最常用）
-                    filename = name.split('/')[-1]
-                    if filename:  # 确保文件名不为空
-                        index[filename] = name
-
-                    # 3. 去除可能的目录前缀
-                    parts = name.split('/')
-                    if len(parts) > 1:
-                        # 去除第一层目录前缀
-                        short_path = '/'.join(parts[1:])
-                        index[short_path] = name
-
-                        # 去除两层目录前缀（双重前缀情况）
-                        if len(parts) > 2:
-                            short_path2 = '/'.join(parts[2:])
-                            index[short_path2] = name
-
-        # 缓存 ZipFile 对象、索引、文件数量和修改时间
-        with performance_timer("缓存 ZipFile 对象和索引到内存"):
-            _zip_file_cache[cache_key] = zf  # 保持 ZipFile 打开！
-            _zip_index_cache[cache_key] = index
-            _zip_file_count_cache[cache_key] = file_count  # 缓存文件数量
-            _zip_file_mtime_cache[cache_key] = current_mtime
-
-        total_ms = (time.perf_counter() - total_start) * 1000
-        logger.info(f"[PERF] ZIP 文件打开和索引构建总耗时: {total_ms:.2f}ms | 文件: {zip_path.name} | 文件数: {file_count} | 索引条目: {len(index)}")
-        return index
-
-    except zipfile.BadZipFile as e:
-        logger.error(f"Invalid ZIP file {zip_path}: {e}")
-        raise HTTPException(status_code=500, detail=f"Invalid ZIP file: {str(e)}")
+        return await asyncio.to_thread(_count_media_rows, dict_id, table_name)
     except Exception as e:
-        logger.error(f"Failed to open ZIP file {zip_path}: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to open ZIP file: {str(e)}")
+        logger.error(f"Failed to count files in {table_name}: {e}")
+        return 0
 
 
 def parse_json_field(value: Optional[str]) -> Any:
@@ -555,49 +909,82 @@ def parse_json_field(value: Optional[str]) -> Any:
     if value is None:
         return None
     try:
-        return json.loads(value)
-    except json.JSONDecodeError:
+        return orjson.loads(value)
+    except orjson.JSONDecodeError:
         return value
 
 
 async def get_zstd_decompressor(dict_id: str) -> Optional[zstd.ZstdDecompressor]:
     """获取词典的 zstd 解压器（带缓存），从 config 表读取压缩字典"""
+    await refresh_dict_db_caches(dict_id)
     if dict_id in _zstd_decompressors:
         return _zstd_decompressors[dict_id]
 
-    conn = await get_db_connection(dict_id)
-    if conn is None:
-        return None
+    # 同一词典的并发冷启动请求只查询一次 config 表
+    async with _zstd_locks.setdefault(dict_id, asyncio.Lock()):
+        if dict_id in _zstd_decompressors:
+            return _zstd_decompressors[dict_id]
 
-    try:
-        cursor = await conn.execute(
-            "SELECT value FROM config WHERE key = 'zstd_dict'"
-        )
-        row = await cursor.fetchone()
-        await cursor.close()
-        if row and row[0]:
-            zdict = zstd.ZstdCompressionDict(bytes(row[0]))
-            dctx = zstd.ZstdDecompressor(dict_data=zdict)
-            _zstd_decompressors[dict_id] = dctx
-            logger.info(f"Loaded zstd dict for '{dict_id}' ({len(bytes(row[0]))} bytes)")
-            return dctx
-        elif row is not None:
-            logger.info(f"Empty zstd_dict for '{dict_id}', using plain decompressor")
-            dctx = zstd.ZstdDecompressor()
-            _zstd_decompressors[dict_id] = dctx
-            return dctx
-        else:
-            logger.info(f"No zstd_dict entry for '{dict_id}', using plain decompressor")
+        try:
+            async with acquire_db(dict_id) as conn:
+                if conn is None:
+                    return None
+                cursor = await conn.execute(
+                    "SELECT value FROM config WHERE key = 'zstd_dict'"
+                )
+                row = await cursor.fetchone()
+                await cursor.close()
+            if row and row[0]:
+                # aiosqlite 返回的 BLOB 已经是 bytes，直接使用，无需再复制
+                zdict = zstd.ZstdCompressionDict(row[0])
+                dctx = zstd.ZstdDecompressor(dict_data=zdict)
+                _zstd_decompressors[dict_id] = dctx
+                _zstd_dicts[dict_id] = zdict
+                logger.info(f"Loaded zstd dict for '{dict_id}' ({len(row[0])} bytes)")
+                return dctx
+            elif row is not None:
+                logger.info(f"Empty zstd_dict for '{dict_id}', using plain decompressor")
+            else:
+                logger.info(f"No zstd_dict entry for '{dict_id}', using plain decompressor")
             dctx = zstd.ZstdDecompressor()
             _zstd_decompressors[dict_id] = dctx
+            _zstd_dicts[dict_id] = None
             return dctx
-    except Exception as e:
-        logger.warning(f"Failed to load zstd dict for '{dict_id}', will retry next request: {e}")
+        except Exception as e:
+            logger.warning(f"Failed to load zstd dict for '{dict_id}', will retry next request: {e}")
+            return None
+
+
+@contextmanager
+def borrow_zstd_compressor():
+    """从空闲列表借出一个 ZstdCompressor（没有空闲的则新建），退出时归还"""
+    try:
+        cctx = _zstd_compressors.get_nowait()
+    except queue.Empty:
+        cctx = zstd.ZstdCompressor(level=3)
+    try:
+        yield cctx
+    finally:
+        _zstd_compressors.put(cctx)
+
+
+def new_zstd_decompressor(dict_id: str) -> Optional[zstd.ZstdDecompressor]:
+    """
+    为线程池中的任务创建独立的解压器
+
+    ZstdDecompressor 实例不是线程安全的，缓存的解压器只能在事件循环线程中使用。
+    必须先调用 get_zstd_decompressor 加载字典；未加载时返回 None（不解压）。
+    """
+    if dict_id not in _zstd_dicts:
         return None
+    zdict = _zstd_dicts[dict_id]
+    if zdict is None:
+        return zstd.ZstdDecompressor()
+    return zstd.ZstdDecompressor(dict_data=zdict)
 
 
 def decompress_json_data(data: bytes, dctx: Optional[zstd.ZstdDecompressor]) -> Any:
-    """解压 json_data BLOB 并解析为对象；若解压失败则直接 json.loads"""
+    """解压 json_data BLOB 并解析为对象；若解压失败则直接 orjson.loads"""
     if data is None:
         return {}
     raw = bytes(data)
@@ -609,20 +996,45 @@ def decompress_json_data(data: bytes, dctx: Optional[zstd.ZstdDecompressor]) ->
             logger.error(f"zstd decompression failed: {e}")
             pass  # Not compressed (or wrong dict) – use as-is
     try:
-        return json.loads(raw)
+        return orjson.loads(raw)
     except Exception as e:
-        logger.error(f"json.loads failed after decompression: {e}")
+        logger.error(f"orjson.loads failed after decompression: {e}")
         return {}
 
 
+def decompress_json_line(data: bytes, dctx: Optional[zstd.ZstdDecompressor]) -> bytes:
+    """
+    解压 json_data BLOB，直接返回 JSON 字节串作为 JSONL 的一行
+
+    写入端存的就是 json.dumps 的结果，解压后即为合法 JSON，无需解析再序列化。
+    只有解压成功时才直接返回：没有解压器（加载失败）时 BLOB 仍是压缩数据，不能当作 JSON 输出。
+    无解压器、解压失败或内容含换行（无法作为 JSONL 单行）时回退到 decompress_json_data。
+    """
+    if data is not None and dctx is not None:
+        try:
+            raw = dctx.decompress(bytes(data))
+        except zstd.ZstdError:
+            pass
+        else:
+            if b"\n" not in raw:
+                return raw
+    return orjson.dumps(decompress_json_data(data, dctx))
+
+
 
 def get_directory_size(path: Path) -> int:
-    """获取目录总大小"""
+    """获取目录总大小（os.scandir 遍历，DirEntry 自带类型信息，每个文件只 stat 一次）"""
     total = 0
-    if path.exists():
-        for item in path.rglob('*'):
-            if item.is_file():
-                total += item.stat().st_size
+    if not path.exists():
+        return total
+    stack = [str(path)]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    total += entry.stat(follow_symlinks=False).st_size
     return total
 
 
@@ -630,56 +1042,50 @@ def count_files_in_directory(path: Path) -> int:
     """统计目录中的所有文件数量（不区分扩展名）"""
     if not path.exists():
         return 0
-    count = 0
-    for item in path.iterdir():
-        if item.is_file():
-            count += 1
-    return count
+    with os.scandir(path) as it:
+        return sum(1 for entry in it if entry.is_file(follow_symlinks=False))
 
 
-async def count_files_in_zip_index(zip_path: Path) -> int:
-    """
-    从缓存中获取 ZIP 文件数量（O(1) 查询）
-
-    性能优化：文件数量在预加载 ZIP 索引时已经统计并缓存，直接读取即可
-
-    Args:
-        zip_path: ZIP 文件路径
-
-    Returns:
-        文件数量
-    """
-    cache_key = str(zip_path)
-
-    # 检查缓存中是否有该 ZIP 文件的文件数量
-    if cache_key in _zip_file_count_cache:
-        # O(1) 直接从缓存读取文件数量
-        return _zip_file_count_cache[cache_key]
-
-    # 缓存中没有，先加载索引（会自动统计并缓存文件数量）
+def _mtime_or_zero(path: Path) -> float:
+    """获取文件修改时间，文件不存在时返回 0"""
     try:
-        await get_zip_index(zip_path)
-        # 加载完成后，文件数量已经缓存
-        return _zip_file_count_cache.get(cache_key, 0)
-    except Exception as e:
-        # ZIP 文件不存在或加载失败
-        logger.error(f"Failed to load ZIP index for {zip_path.name}: {e}")
+        return path.stat().st_mtime
+    except OSError:
         return 0
 
 
 async def get_dictionary_info(dict_id: str) -> Optional[DictionaryInfo]:
-    """获取词典详细信息"""
+    """
+    获取词典详细信息
+
+    结果按词典目录、metadata.json、dictionary.db、media.db 及媒体目录的 mtime 缓存，
+    文件未变化时只需几次 stat，不再重复查询数据库和遍历目录。
+    """
     dict_path = DICTIONARIES_PATH / dict_id
     
     if not dict_path.exists() or not dict_path.is_dir():
         return None
-    
-    metadata = {}
+
     metadata_path = dict_path / "metadata.json"
+    cache_key = tuple(
+        _mtime_or_zero(path)
+        for path in (
+            dict_path,
+            metadata_path,
+            dict_path / "dictionary.db",
+            dict_path / "media.db",
+            dict_path / "audios",
+            dict_path / "images",
+        )
+    )
+    cached = _dict_info_cache.get(dict_id)
+    if cached is not None and cached[0] == cache_key:
+        return cached[1]
+
+    metadata = {}
     if metadata_path.exists():
         try:
-            with open(metadata_path, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
+            metadata = orjson.loads(metadata_path.read_bytes())
         except Exception as e:
             logger.warning(f"Failed to read metadata for {dict_id}: {e}")
     
@@ -691,12 +1097,14 @@ async def get_dictionary_info(dict_id: str) -> Optional[DictionaryInfo]:
     entry_count = 0
     if db_path.exists():
         try:
-            conn = await get_db_connection(dict_id)
-            if conn:
-                cursor = await conn.execute("SELECT COUNT(DISTINCT headword) as count FROM entries")
-                row = await cursor.fetchone()
-                entry_count = row[0] if row else 0
-                await cursor.close()
+            async with acquire_db(dict_id) as conn:
+                if conn:
+                    # 同一 headword 可对应多个词条，需按 headword 去重；
+                    # 有 idx_headword 时 SQLite 直接走覆盖索引扫描，不会建临时 B-tree
+                    cursor = await conn.execute("SELECT COUNT(DISTINCT headword) as count FROM entries")
+                    row = await cursor.fetchone()
+                    entry_count = row[0] if row else 0
+                    await cursor.close()
         except Exception as e:
             logger.warning(f"Failed to count entries for {dict_id}: {e}")
 
@@ -715,10 +1123,9 @@ async def get_dictionary_info(dict_id: str) -> Optional[DictionaryInfo]:
     elif images_path.exists():
         image_count = count_files_in_directory(images_path)
 
-    stat = dict_path.stat()
-    updated_at = datetime.fromtimestamp(stat.st_mtime).isoformat()
+    updated_at = datetime.fromtimestamp(cache_key[0]).isoformat()
 
-    return DictionaryInfo(
+    info = DictionaryInfo(
         id=dict_id,
         name=metadata.get('name', dict_id),
         version=metadata.get('version', 1),
@@ -729,6 +1136,8 @@ async def get_dictionary_info(dict_id: str) -> Optional[DictionaryInfo]:
         media_size=media_size,
         updated_at=updated_at
     )
+    _dict_info_cache[dict_id] = (cache_key, info)
+    return info
 
 
 @app.get("/health")
@@ -737,11 +1146,12 @@ async def health_check():
     return {"status": "healthy", "service": "easydict-api"}
 
 
+# 允许下载的文件: {文件名: (MIME 类型, 响应头)}
 ALLOWED_FILES = {
-    "logo.png":      ("image/png",                 2592000),  # 缓存30天
-    "metadata.json": ("application/json",           86400),   # 缓存1天
-    "dictionary.db": ("application/vnd.sqlite3",    86400),   # 缓存1天
-    "media.db":      ("application/vnd.sqlite3",    2592000), # 缓存30天
+    "logo.png":      ("image/png",               {"Cache-Control": "public, max-age=2592000"}),  # 缓存30天
+    "metadata.json": ("application/json",        {"Cache-Control": "public, max-age=86400"}),    # 缓存1天
+    "dictionary.db": ("application/vnd.sqlite3", {"Cache-Control": "public, max-age=86400"}),    # 缓存1天
+    "media.db":      ("application/vnd.sqlite3", {"Cache-Control": "public, max-age=2592000"}),  # 缓存30天
 }
 
 
@@ -751,18 +1161,34 @@ async def download_file(dict_id: str, filename: str):
     if filename not in ALLOWED_FILES:
         raise HTTPException(status_code=400, detail=f"File '{filename}' not allowed")
 
-    file_path = DICTIONARIES_PATH / dict_id / filename
-    if not file_path.exists():
+    file_path = _DICT_ROOT / dict_id / filename
+    # 只 stat 一次：既判断文件是否存在，也交给 FileResponse 生成 Content-Length / ETag / Last-Modified
+    try:
+        stat_result = file_path.stat()
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail=f"File '{filename}' not found for dictionary '{dict_id}'")
 
-    media_type, max_age = ALLOWED_FILES[filename]
-    return FileResponse(
-        path=str(file_path),
-        media_type=media_type,
-        headers={
-            "Cache-Control": f"public, max-age={max_age}"
-        }
-    )
+    media_type, headers = ALLOWED_FILES[filename]
+    return file_response(file_path, stat_result, media_type, headers)
+
+
+def iter_compressed_jsonl(rows: List[Any], dctx: Optional[zstd.ZstdDecompressor]) -> Iterator[bytes]:
+    """
+    将词条行解压拼接为 JSONL 并以 zstd 流式压缩输出
+
+    这是同步生成器：StreamingResponse 会在线程池中迭代它，解压/序列化/压缩都不会阻塞事件循环。
+    先算出 JSONL 总长度再压缩，使 zstd 帧头仍带有内容大小（兼容一次性解压的客户端）。
+    """
+    lines = [decompress_json_line(row[1], dctx) for row in rows]
+    total_size = sum(len(line) for line in lines) + len(lines) - 1
+
+    with borrow_zstd_compressor() as cctx:
+        cobj = cctx.compressobj(size=total_size)
+        for i, line in enumerate(lines):
+            chunk = cobj.compress(line if i == 0 else b"\n" + line)
+            if chunk:
+                yield chunk
+        yield cobj.flush()
 
 
 class EntryIdsRequest(BaseModel):
@@ -792,33 +1218,29 @@ async def download_entries_batch(dict_id: str, data: EntryIdsRequest):
         if entry_id > 2**31 - 1:
             raise HTTPException(status_code=400, detail="Entry ID too large")
 
-    dctx = await get_zstd_decompressor(dict_id)
-
-    conn = await get_db_connection(dict_id)
-    if conn is None:
-        raise HTTPException(status_code=404, detail=f"Dictionary '{dict_id}' not found")
-    placeholders = ",".join("?" * len(entry_ids))
-    cursor = await conn.execute(
-        f"SELECT entry_id, json_data FROM entries WHERE entry_id IN ({placeholders})",
-        entry_ids
-    )
-    rows = await cursor.fetchall()
-    await cursor.close()
+    # 加载压缩字典；实际解压在线程池中用独立的解压器完成
+    await get_zstd_decompressor(dict_id)
+
+    rows = []
+    async with acquire_db(dict_id) as conn:
+        if conn is None:
+            raise HTTPException(status_code=404, detail=f"Dictionary '{dict_id}' not found")
+        # 分批查询，避免超过旧版 SQLite 999 个绑定变量的限制
+        for start in range(0, len(entry_ids), SQLITE_IN_CHUNK_SIZE):
+            chunk = entry_ids[start:start + SQLITE_IN_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            cursor = await conn.execute(
+                f"SELECT entry_id, json_data FROM entries WHERE entry_id IN ({placeholders})",
+                chunk
+            )
+            rows.extend(await cursor.fetchall())
+            await cursor.close()
 
     if not rows:
         raise HTTPException(status_code=404, detail="No entries found")
 
-    jsonl_lines = []
-    for row in rows:
-        entry_json = decompress_json_data(row[1], dctx)
-        jsonl_lines.append(json.dumps(entry_json, ensure_ascii=False))
-
-    jsonl_bytes = "\n".join(jsonl_lines).encode("utf-8")
-    cctx = zstd.ZstdCompressor(level=3)
-    compressed = cctx.compress(jsonl_bytes)
-
     return StreamingResponse(
-        iter([compressed]),
+        iter_compressed_jsonl(rows, new_zstd_decompressor(dict_id)),
         media_type="application/zstd",
         headers={
             "Content-Disposition": f'attachment; filename="entries.zst"',
@@ -827,42 +1249,53 @@ async def download_entries_batch(dict_id: str, data: EntryIdsRequest):
     )
 
 
-
 @app.get("/word/{dict_id}/{word}")
 async def query_word(dict_id: str, word: str, request: Request):
     """查询单词接口"""
     logger.info(f"Querying word '{word}' in dictionary '{dict_id}'")
 
-    conn = await get_db_connection(dict_id)
-    if conn is None:
-        raise HTTPException(status_code=404, detail=f"Dictionary '{dict_id}' not found")
+    # 先获取解压器（内部也会借用连接），避免持有连接时再次向同一连接池借连接
+    dctx = await get_zstd_decompressor(dict_id)
 
-    try:
-        cursor = await conn.execute(
-            """
-            SELECT * FROM entries
-            WHERE headword = ?
-            ORDER BY headword
-            LIMIT 50
-            """,
-            (word,)
-        )
+    async with acquire_db(dict_id) as conn:
+        if conn is None:
+            raise HTTPException(status_code=404, detail=f"Dictionary '{dict_id}' not found")
 
-        rows = await cursor.fetchall()
-        await cursor.close()
+        try:
+            # 精确匹配优先
+            cursor = await conn.execute(
+                "SELECT * FROM entries WHERE headword = ? LIMIT ?",
+                (word, WORD_QUERY_LIMIT)
+            )
+            rows = await cursor.fetchall()
+            await cursor.close()
 
-        dctx = await get_zstd_decompressor(dict_id)
-        entries = [decompress_json_data(row['json_data'], dctx) for row in rows]
+            # 不足上限时补充前缀匹配：用 (word, word + U+10FFFF) 的范围条件代替 LIKE 'word%'，
+            # 可以直接在 idx_headword 上做有序范围扫描，取够 LIMIT 条即停止
+            if len(rows) < WORD_QUERY_LIMIT:
+                cursor = await conn.execute(
+                    """
+                    SELECT * FROM entries
+                    WHERE headword > ? AND headword < ?
+                    ORDER BY headword
+                    LIMIT ?
+                    """,
+                    (word, word + "\U0010ffff", WORD_QUERY_LIMIT - len(rows))
+                )
+                rows += await cursor.fetchall()
+                await cursor.close()
 
-        return JSONResponse({
-            "dict_id": dict_id,
-            "word": word,
-            "entries": entries,
-            "total": len(entries)
-        })
-    except Exception as e:
-        logger.error(f"Error querying word '{word}': {e}")
-        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+            entries = [decompress_json_data(row['json_data'], dctx) for row in rows]
+
+            return ORJSONResponse({
+                "dict_id": dict_id,
+                "word": word,
+                "entries": entries,
+                "total": len(entries)
+            })
+        except Exception as e:
+            logger.error(f"Error querying word '{word}': {e}")
+            raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
 @app.get("/entry/{dict_id}/{entry_id}")
@@ -874,56 +1307,44 @@ async def query_entry(dict_id: str, entry_id: int):
     if entry_id > 2**31 - 1:
         raise HTTPException(status_code=400, detail="Entry ID too large")
     
-    conn = await get_db_connection(dict_id)
-    if conn is None:
-        raise HTTPException(status_code=404, detail=f"Dictionary '{dict_id}' not found")
+    dctx = await get_zstd_decompressor(dict_id)
 
-    try:
-        cursor = await conn.execute(
-            "SELECT json_data FROM entries WHERE entry_id = ?",
-            (entry_id,)
-        )
-        row = await cursor.fetchone()
-        await cursor.close()
+    async with acquire_db(dict_id) as conn:
+        if conn is None:
+            raise HTTPException(status_code=404, detail=f"Dictionary '{dict_id}' not found")
 
-        if row is None:
-            raise HTTPException(status_code=404, detail=f"Entry '{entry_id}' not found")
+        try:
+            cursor = await conn.execute(
+                "SELECT json_data FROM entries WHERE entry_id = ?",
+                (entry_id,)
+            )
+            row = await cursor.fetchone()
+            await cursor.close()
 
-        dctx = await get_zstd_decompressor(dict_id)
-        return JSONResponse(decompress_json_data(row['json_data'], dctx))
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error querying entry '{entry_id}': {e}")
-        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+            if row is None:
+                raise HTTPException(status_code=404, detail=f"Entry '{entry_id}' not found")
+
+            return ORJSONResponse(decompress_json_data(row['json_data'], dctx))
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error querying entry '{entry_id}': {e}")
+            raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
 @app.delete("/internal/cache/{dict_id}")
 async def invalidate_dict_cache(dict_id: str):
     """清除指定词典的所有连接缓存和解压器缓存（供 user 服务在更新 dictionary.db / media.db 后调用）"""
-    closed_db = False
-    if dict_id in _db_connections:
-        try:
-            await _db_connections[dict_id].close()
-        except Exception:
-            pass
-        del _db_connections[dict_id]
-        closed_db = True
-
-    closed_media = False
-    media_key = f"media_{dict_id}"
-    if media_key in _media_db_connections:
-        try:
-            await _media_db_connections[media_key].close()
-        except Exception:
-            pass
-        del _media_db_connections[media_key]
-        closed_media = True
+    closed_db = await drop_dict_db_caches(dict_id)
+    _dict_db_idents.pop(dict_id, None)
 
-    if dict_id in _zstd_decompressors:
-        del _zstd_decompressors[dict_id]
+    _media_blob_cache_drop(dict_id)
+    _media_storage_cache.pop(dict_id, None)
+    # 新请求不再复用更新前发起的查询
+    for key in [key for key in _media_blob_inflight if key[0] == dict_id]:
+        del _media_blob_inflight[key]
 
-    logger.info(f"Cache invalidated for '{dict_id}' (db={closed_db}, media={closed_media})")
+    logger.info(f"Cache invalidated for '{dict_id}' (db={closed_db})")
     return {"invalidated": dict_id}
 
 
@@ -933,262 +1354,168 @@ async def list_dictionaries():
     获取词典商店列表
     返回所有可用词典的详细信息
     """
-    dictionaries = []
-    
     if not DICTIONARIES_PATH.exists():
-        return {"dictionaries": dictionaries}
-    
-    for item in DICTIONARIES_PATH.iterdir():
-        if item.is_dir():
-            dict_info = await get_dictionary_info(item.name)
-            if dict_info:
-                dictionaries.append(dict_info.dict())
+        return {"dictionaries": []}
     
+    # 并发获取各词典信息（stat 与 COUNT 查询的 I/O 等待相互重叠），用信号量限制并发数
+    semaphore = asyncio.Semaphore(DICT_INFO_CONCURRENCY)
+
+    async def _get_info(dict_id: str) -> Optional[DictionaryInfo]:
+        async with semaphore:
+            return await get_dictionary_info(dict_id)
+
+    dict_ids = [item.name for item in DICTIONARIES_PATH.iterdir() if item.is_dir()]
+    infos = [info for info in await asyncio.gather(*map(_get_info, dict_ids)) if info]
+
     # 按名称排序
-    dictionaries.sort(key=lambda x: x['name'])
+    infos.sort(key=lambda info: info.name)
+
+    # 直接返回 ORJSONResponse，跳过 FastAPI 的 jsonable_encoder 二次遍历
+    return ORJSONResponse({"dictionaries": [info.model_dump() for info in infos]})
+
 
-    return {"dictionaries": dictionaries}
+def stat_regular_file(path: Path) -> Optional[os.stat_result]:
+    """stat 一次文件：是普通文件时返回 stat 结果（可直接交给 FileResponse），否则返回 None"""
+    try:
+        stat_result = path.stat()
+    except OSError:
+        return None
+    return stat_result if stat.S_ISREG(stat_result.st_mode) else None
 
 
-async def get_file_from_zip(zip_path: Path, file_path: str, media_type: str, filename: str):
+def x_accel_uri(path: Path) -> Optional[str]:
+    """把词典目录或辅助目录下的真实路径映射为 nginx internal location 的 URI，不在其中时返回 None"""
+    for root, prefix in ((_DICT_ROOT, "/_internal/dictionaries/"), (_AUX_ROOT, "/_internal/auxiliary/")):
+        try:
+            relative = path.relative_to(root)
+        except ValueError:
+            continue
+        if ".." in relative.parts:
+            return None
+        return prefix + quote(relative.as_posix())
+    return None
+
+
+def file_response(path: Path, stat_result: os.stat_result, media_type: str, headers: Dict[str, str]) -> Response:
     """
-    从 zip 文件中提取单个文件并返回（使用缓存的 ZipFile 对象）
-
-    性能保证：
-    - 使用已打开并缓存的 ZipFile 对象，不需要每次重新打开
-    - 使用缓存的 ZIP 索引，O(1) 路径查找
-    - 不会读取整个 zip 文件
-    - 不会将整个目标文件读入内存
-    - 使用生成器逐块流式返回
-    - 内存占用恒定 O(64KB)，与文件大小无关
-
-    性能提升：
-    - 服务启动后: ZIP 文件已打开，索引已构建
-    - 首次访问: <1ms (直接使用缓存的 ZipFile 对象) ⚡⚡⚡
+    返回磁盘文件
+
+    USE_X_ACCEL=1 时只返回 X-Accel-Redirect 头，由 nginx 以 sendfile 发送文件内容（并处理 Range），
+    否则使用 FileResponse（传入已有的 stat 结果，不再重复 stat）。
     """
-    request_start = time.perf_counter()
-    logger.info(f"[REQUEST] 开始处理 ZIP 文件请求: {zip_path.name}/{file_path}")
+    if USE_X_ACCEL:
+        uri = x_accel_uri(path)
+        if uri is not None:
+            return Response(media_type=media_type, headers={**headers, "X-Accel-Redirect": uri})
+    return FileResponse(path=str(path), stat_result=stat_result, media_type=media_type, headers=headers)
 
-    try:
-        # 🚀 使用缓存的索引，O(1) 查找！
-        get_index_start = time.perf_counter()
-        zip_index = await get_zip_index(zip_path)
-        get_index_ms = (time.perf_counter() - get_index_start) * 1000
-        logger.info(f"[PERF] 获取 ZIP 索引耗时: {get_index_ms:.2f}ms")
-
-        # 在字典中查找，O(1) 复杂度
-        lookup_start = time.perf_counter()
-        if file_path not in zip_index:
-            raise HTTPException(
-                status_code=404,
-                detail=f"File '{file_path}' not found in zip archive '{zip_path.name}'"
-            )
-        target_path = zip_index[file_path]
-        lookup_ms = (time.perf_counter() - lookup_start) * 1000
-        logger.info(f"[PERF] 路径查找耗时: {lookup_ms:.2f}ms | 目标路径: {target_path}")
-
-        # 获取缓存的 ZipFile 对象
-        cache_key = str(zip_path)
-        zf = _zip_file_cache.get(cache_key)
-        if not zf:
-            # 这不应该发生，因为 get_zip_index 应该已经打开并缓存了
-            raise HTTPException(
-                status_code=500,
-                detail=f"ZipFile object not found in cache for {zip_path.name}"
-            )
 
-        # 创建流式生成器，使用缓存的 ZipFile 对象
-        async def file_iterator():
-            """异步生成器，逐块读取文件内容"""
-            iter_start = time.perf_counter()
-            chunk_count = 0
-            total_bytes = 0
-
-            # 🚀 直接使用已打开的 ZipFile 对象，不需要重新打开！
-            open_start = time.perf_counter()
-            with zf.open(target_path) as f:
-                open_ms = (time.perf_counter() - open_start) * 1000
-                logger.info(f"[PERF] 打开 ZIP 内文件耗时: {open_ms:.2f}ms")
-
-                while True:
-                    chunk = f.read(65536)  # 每次只读 64KB
-                    if not chunk:
-                        break
-                    chunk_count += 1
-                    total_bytes += len(chunk)
-                    yield chunk
-
-            iter_ms = (time.perf_counter() - iter_start) * 1000
-            logger.info(f"[PERF] 文件流式读取完成 | 块数: {chunk_count} | 字节: {total_bytes} | 耗时: {iter_ms:.2f}ms")
-
-        total_prepare_ms = (time.perf_counter() - request_start) * 1000
-        logger.info(f"[PERF] 响应准备完成，开始流式传输 | 总准备耗时: {total_prepare_ms:.2f}ms")
-
-        return StreamingResponse(
-            file_iterator(),
-            media_type=media_type,
-            headers={
-                "Content-Disposition": f'inline; filename="{filename}"',
-                "Cache-Control": "public, max-age=2592000"
-            }
-        )
+def resolve_regular_file(base_dir: Path, relative_path: str) -> tuple[Path, Optional[os.stat_result]]:
+    """
+    解析 base_dir 下的相对路径并 stat（同步函数，整体作为一次线程池任务执行）
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error reading from zip file {zip_path}: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to read file from zip: {str(e)}")
+    Returns:
+        (解析后的真实路径, stat 结果或 None（不存在或不是普通文件）)
+
+    Raises:
+        ValueError: 解析后的路径不在 base_dir 内（../ 或指向目录外的符号链接）
+    """
+    file_path = (base_dir / relative_path).resolve()
+    file_path.relative_to(base_dir.resolve())
+    return file_path, stat_regular_file(file_path)
+
+
+MEDIA_TYPES = {
+    'mp3': 'audio/mpeg',
+    'wav': 'audio/wav',
+    'ogg': 'audio/ogg',
+    'png': 'image/png',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'gif': 'image/gif',
+    'webp': 'image/webp'
+}
 
 
 def get_media_type(filename: str) -> str:
     """根据文件扩展名获取 MIME 类型"""
-    ext = filename.split('.')[-1].lower()
-    media_types = {
-        'mp3': 'audio/mpeg',
-        'wav': 'audio/wav',
-        'ogg': 'audio/ogg',
-        'png': 'image/png',
-        'jpg': 'image/jpeg',
-        'jpeg': 'image/jpeg',
-        'gif': 'image/gif',
-        'webp': 'image/webp'
-    }
-    return media_types.get(ext, 'application/octet-stream')
+    return MEDIA_TYPES.get(filename.rpartition('.')[2].lower(), 'application/octet-stream')
 
 
 @app.get("/audio/{dict_id}/{file_path:path}")
-async def get_audio_file(dict_id: str, file_path: str):
+async def get_audio_file(dict_id: str, file_path: str, request: Request):
     """
     获取单个音频文件
     如果 media.db 存在，则从数据库中读取
     否则兼容旧的目录结构
     """
-    request_start = time.perf_counter()
-    logger.info(f"===== [AUDIO REQUEST] 开始处理音频请求 | 词典: {dict_id} | 文件: {file_path} =====")
-
-    dict_path = DICTIONARIES_PATH / dict_id
-    if not dict_path.exists():
+    # 请求日志降为 DEBUG，且只在 DEBUG 开启时计时，避免每次请求都格式化日志
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if debug:
+        request_start = time.perf_counter()
+        logger.debug("[AUDIO] 开始处理音频请求 | 词典: %s | 文件: %s", dict_id, file_path)
+
+    uses_media_db = get_media_storage(dict_id)
+    if uses_media_db is None:
         raise HTTPException(status_code=404, detail=f"Dictionary '{dict_id}' not found")
+    dict_path = DICTIONARIES_PATH / dict_id
 
     media_type = get_media_type(file_path)
 
     # 优先从 media.db 数据库中读取
-    media_db_path = dict_path / "media.db"
-    if media_db_path.exists():
-        logger.info(f"[AUDIO] 从 media.db 数据库读取: {file_path}")
+    if uses_media_db:
         try:
-            conn = await get_media_db_connection(dict_id)
-            if not conn:
-                raise HTTPException(status_code=500, detail="Failed to connect to media database")
-
-            cursor = await conn.execute(
-                "SELECT blob FROM audios WHERE name = ?",
-                (file_path,)
-            )
-            row = await cursor.fetchone()
-            await cursor.close()
-
-            if not row:
+            response = await serve_media_blob(request, dict_id, "audios", file_path, media_type)
+            if response is None:
                 raise HTTPException(status_code=404, detail=f"Audio file '{file_path}' not found in database")
 
-            blob_data = row[0]
+            if debug:
+                logger.debug("[AUDIO] 从数据库返回 | 总耗时: %.2fms", (time.perf_counter() - request_start) * 1000)
 
-            async def audio_iterator():
-                chunk_size = 65536
-                for i in range(0, len(blob_data), chunk_size):
-                    yield blob_data[i:i + chunk_size]
-
-            total_ms = (time.perf_counter() - request_start) * 1000
-            logger.info(f"===== [AUDIO REQUEST] 从数据库返回 | 总耗时: {total_ms:.2f}ms =====")
-
-            return StreamingResponse(
-                audio_iterator(),
-                media_type=media_type,
-                headers={
-                    "Content-Disposition": f'inline; filename="{file_path}"',
-                    "Cache-Control": "public, max-age=2592000"
-                }
-            )
+            return response
         except HTTPException:
             raise
         except Exception as e:
             logger.error(f"[AUDIO] 从数据库读取失败: {e}")
 
     # 兼容旧的目录结构
-    logger.info(f"[AUDIO] 从目录读取: {file_path}")
-    audios_path = dict_path / "audios"
-    audio_file = (audios_path / file_path).resolve()
-    
     # Security: Prevent path traversal attacks
     try:
-        audio_file.relative_to(audios_path.resolve())
+        audio_file, stat_result = await asyncio.to_thread(resolve_regular_file, dict_path / "audios", file_path)
     except ValueError:
         raise HTTPException(status_code=403, detail="Access denied - path traversal not allowed")
-    
-    if audio_file.exists() and audio_file.is_file():
-        response = FileResponse(
-            path=str(audio_file),
-            media_type=media_type,
-            headers={
-                "Cache-Control": "public, max-age=2592000"  # 缓存30天
-            }
-        )
-        total_ms = (time.perf_counter() - request_start) * 1000
-        logger.info(f"===== [AUDIO REQUEST] 从目录返回 | 总耗时: {total_ms:.2f}ms =====")
+
+    if stat_result is not None:
+        response = file_response(audio_file, stat_result, media_type, _MEDIA_FILE_HEADERS)
+        if debug:
+            logger.debug("[AUDIO] 从目录返回 | 总耗时: %.2fms", (time.perf_counter() - request_start) * 1000)
         return response
 
     raise HTTPException(status_code=404, detail=f"Audio file '{file_path}' not found")
 
 
 @app.get("/image/{dict_id}/{file_path:path}")
-async def get_image_file(dict_id: str, file_path: str):
+async def get_image_file(dict_id: str, file_path: str, request: Request):
     """
     获取单个图片文件
     如果 media.db 存在，则从数据库中读取
     否则兼容旧的目录结构
     """
-    dict_path = DICTIONARIES_PATH / dict_id
-    if not dict_path.exists():
+    uses_media_db = get_media_storage(dict_id)
+    if uses_media_db is None:
         raise HTTPException(status_code=404, detail=f"Dictionary '{dict_id}' not found")
+    dict_path = DICTIONARIES_PATH / dict_id
 
     media_type = get_media_type(file_path)
 
     # 优先从 media.db 数据库中读取
-    media_db_path = dict_path / "media.db"
-    if media_db_path.exists():
+    if uses_media_db:
         try:
-            conn = await get_media_db_connection(dict_id)
-            if not conn:
-                raise HTTPException(status_code=500, detail="Failed to connect to media database")
-
-            # 查询图片文件
-            cursor = await conn.execute(
-                "SELECT blob FROM images WHERE name = ?",
-                (file_path,)
-            )
-            row = await cursor.fetchone()
-            await cursor.close()
-
-            if not row:
+            response = await serve_media_blob(request, dict_id, "images", file_path, media_type)
+            if response is None:
                 raise HTTPException(status_code=404, detail=f"Image file '{file_path}' not found in database")
 
-            # 获取 blob 数据
-            blob_data = row[0]
-
-            # 创建流式生成器（不缓存文件内容，每次都从数据库读取）
-            async def image_iterator():
-                chunk_size = 65536  # 64KB
-                for i in range(0, len(blob_data), chunk_size):
-                    yield blob_data[i:i + chunk_size]
-
-            return StreamingResponse(
-                image_iterator(),
-                media_type=media_type,
-                headers={
-                    "Content-Disposition": f'inline; filename="{file_path}"',
-                    "Cache-Control": "public, max-age=2592000"  # 缓存30天
-                }
-            )
+            return response
 
         except HTTPException:
             raise
@@ -1197,23 +1524,14 @@ async def get_image_file(dict_id: str, file_path: str):
             # 继续尝试从目录读取
 
     # 兼容旧的目录结构
-    images_path = dict_path / "images"
-    image_file = (images_path / file_path).resolve()
-    
     # Security: Prevent path traversal attacks
     try:
-        image_file.relative_to(images_path.resolve())
+        image_file, stat_result = await asyncio.to_thread(resolve_regular_file, dict_path / "images", file_path)
     except ValueError:
         raise HTTPException(status_code=403, detail="Access denied - path traversal not allowed")
-    
-    if image_file.exists() and image_file.is_file():
-        return FileResponse(
-            path=str(image_file),
-            media_type=media_type,
-            headers={
-                "Cache-Control": "public, max-age=2592000"  # 缓存30天
-            }
-        )
+
+    if stat_result is not None:
+        return file_response(image_file, stat_result, media_type, _MEDIA_FILE_HEADERS)
 
     raise HTTPException(status_code=404, detail=f"Image file '{file_path}' not found")
 
@@ -1231,18 +1549,18 @@ async def get_auxiliary_file(filename: str):
     """
     logger.info(f"[AUXI] Requesting auxiliary file: {filename}")
 
-    # 安全检查：确保文件名不包含路径遍历攻击
-    if '..' in filename or filename.startswith('/'):
+    # 安全检查：解析后的真实路径必须位于辅助目录内（同时拦截 ../ 与指向目录外的符号链接）
+    # 路径解析与 stat 合并为一次线程池任务
+    try:
+        file_path, stat_result = await asyncio.to_thread(resolve_regular_file, _AUX_ROOT, filename)
+    except ValueError:
         raise HTTPException(
             status_code=400,
             detail="Invalid filename. Path traversal is not allowed."
         )
 
-    # 构建文件路径
-    file_path = AUXILIARY_PATH / filename
-
     # 检查文件是否存在且是文件（不是目录）
-    if not file_path.exists() or not file_path.is_file():
+    if stat_result is None:
         logger.warning(f"[AUXI] File not found: {file_path}")
         raise HTTPException(
             status_code=404,
@@ -1254,13 +1572,7 @@ async def get_auxiliary_file(filename: str):
 
     logger.info(f"[AUXI] Serving file: {file_path} ({media_type})")
 
-    return FileResponse(
-        path=str(file_path),
-        media_type=media_type,
-        headers={
-            "Cache-Control": "public, max-age=86400"  # 缓存1天
-        }
-    )
+    return file_response(file_path, stat_result, media_type, _AUXILIARY_FILE_HEADERS)
 
 
 # 根页面 - HTML 欢迎页面
@@ -1435,7 +1747,7 @@ async def root():
 async def global_exception_handler(request: Request, exc: Exception):
     """全局异常处理"""
     logger.error(f"Unhandled exception: {exc}", exc_info=True)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={"detail": "Internal server error"}
     )
@@ -13,6 +13,7 @@ import os
 import sys
 import logging
 import zipfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Optional
 
@@ -46,6 +47,9 @@ def create_media_db(dict_path: Path) -> bool:
     try:
         conn = sqlite3.connect(str(media_db_path))
 
+        # 新库使用 8KB 页：blob 跨越的溢出页更少（必须在建表前设置）
+        conn.execute("PRAGMA page_size=8192")
+
         # 创建 audios 表
         conn.execute("""
             CREATE TABLE IF NOT EXISTS audios (
@@ -62,10 +66,6 @@ def create_media_db(dict_path: Path) -> bool:
             )
         """)
 
-        # 创建索引以提高查询性能
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_audios_name ON audios(name)")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_images_name ON images(name)")
-
         conn.commit()
         conn.close()
 
@@ -77,6 +77,39 @@ def create_media_db(dict_path: Path) -> bool:
         return False
 
 
+def iter_zip_files(zf: zipfile.ZipFile):
+    """逐个读取 ZIP 中的文件，生成 (文件名, 内容)，文件名不包含路径"""
+    for file_info in zf.infolist():
+        if file_info.is_dir():
+            continue
+        # 直接用 ZipInfo 打开，跳过按文件名查找中央目录
+        with zf.open(file_info) as f:
+            yield file_info.filename.split('/')[-1], f.read()
+
+
+def migrate_zip_table(conn: sqlite3.Connection, zip_path: Path, table_name: str) -> int:
+    """
+    将单个 ZIP 文件中的所有文件写入 media.db 的指定表
+
+    在一个 BEGIN IMMEDIATE 事务中用 executemany 批量插入，失败时回滚
+
+    Returns:
+        写入的文件数量
+    """
+    with zipfile.ZipFile(zip_path, 'r') as zf:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.executemany(
+                f"INSERT OR REPLACE INTO {table_name} (name, blob) VALUES (?, ?)",
+                iter_zip_files(zf)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return cursor.rowcount
+
+
 def migrate_zip_to_media_db(dict_path: Path, dict_id: str) -> bool:
     """
     将 audios.zip 和 images.zip 中的文件迁移到 media.db
@@ -105,70 +138,28 @@ def migrate_zip_to_media_db(dict_path: Path, dict_id: str) -> bool:
 
         # 获取数据库连接
         conn = sqlite3.connect(str(media_db_path))
-
-        # 迁移音频文件
-        if audios_zip.exists():
-            logger.info(f"  → 迁移音频文件: {audios_zip.name}")
-            try:
-                with zipfile.ZipFile(audios_zip, 'r') as zf:
-                    audio_count = 0
-                    for file_info in zf.filelist:
-                        if file_info.is_dir():
-                            continue
-
-                        file_name = file_info.filename
-                        # 只使用文件名，不包含路径
-                        simple_name = file_name.split('/')[-1]
-
-                        # 读取文件内容
-                        file_data = zf.read(file_name)
-
-                        # 插入数据库
-                        conn.execute(
-                            "INSERT OR REPLACE INTO audios (name, blob) VALUES (?, ?)",
-                            (simple_name, file_data)
-                        )
-                        audio_count += 1
-
-                conn.commit()
-                logger.info(f"  ✓ 音频迁移完成: {audio_count} 个文件")
-            except Exception as e:
-                logger.error(f"  ✗ 音频迁移失败: {e}")
-                conn.close()
-                return False
-
-        # 迁移图片文件
-        if images_zip.exists():
-            logger.info(f"  → 迁移图片文件: {images_zip.name}")
-            try:
-                with zipfile.ZipFile(images_zip, 'r') as zf:
-                    image_count = 0
-                    for file_info in zf.filelist:
-                        if file_info.is_dir():
-                            continue
-
-                        file_name = file_info.filename
-                        # 只使用文件名，不包含路径
-                        simple_name = file_name.split('/')[-1]
-
-                        # 读取文件内容
-                        file_data = zf.read(file_name)
-
-                        # 插入数据库
-                        conn.execute(
-                            "INSERT OR REPLACE INTO images (name, blob) VALUES (?, ?)",
-                            (simple_name, file_data)
-                        )
-                        image_count += 1
-
-                conn.commit()
-                logger.info(f"  ✓ 图片迁移完成: {image_count} 个文件")
-            except Exception as e:
-                logger.error(f"  ✗ 图片迁移失败: {e}")
-                conn.close()
-                return False
-
-        conn.close()
+        # 一次性批量导入：不等待 fsync（进程异常时事务仍可回滚，仅系统崩溃有风险）
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        # 256MB 页缓存，吸收批量插入产生的页写入
+        conn.execute("PRAGMA cache_size=-262144")
+
+        try:
+            for zip_path, table_name, label in (
+                (audios_zip, "audios", "音频"),
+                (images_zip, "images", "图片"),
+            ):
+                if not zip_path.exists():
+                    continue
+                logger.info(f"  → 迁移{label}文件: {zip_path.name}")
+                try:
+                    count = migrate_zip_table(conn, zip_path, table_name)
+                    logger.info(f"  ✓ {label}迁移完成: {count} 个文件")
+                except Exception as e:
+                    logger.error(f"  ✗ {label}迁移失败: {e}")
+                    return False
+        finally:
+            conn.close()
 
         # 统计迁移结果
         if media_db_path.exists():
@@ -183,6 +174,12 @@ def migrate_zip_to_media_db(dict_path: Path, dict_id: str) -> bool:
         return False
 
 
+def _migrate_one(dict_path: Path) -> bool:
+    """进程池任务：迁移单个词典"""
+    logger.info(f"\n处理词典: {dict_path.name}")
+    return migrate_zip_to_media_db(dict_path, dict_path.name)
+
+
 def migrate_all_dictionaries():
     """迁移所有词典"""
     if not DICTIONARIES_PATH.exists():
@@ -194,24 +191,16 @@ def migrate_all_dictionaries():
     logger.info(f"词典目录: {DICTIONARIES_PATH}")
     logger.info("=" * 60)
 
-    success_count = 0
-    fail_count = 0
-    total_count = 0
-
     # 扫描所有词典目录
-    for dict_path in DICTIONARIES_PATH.iterdir():
-        if not dict_path.is_dir():
-            continue
-
-        dict_id = dict_path.name
-        total_count += 1
+    dict_paths = [p for p in DICTIONARIES_PATH.iterdir() if p.is_dir()]
+    total_count = len(dict_paths)
 
-        logger.info(f"\n处理词典: {dict_id}")
+    # 每个词典的解压和写库都是 CPU 密集型，用进程池并行迁移（各进程自行打开连接）
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        results = list(executor.map(_migrate_one, dict_paths))
 
-        if migrate_zip_to_media_db(dict_path, dict_id):
-            success_count += 1
-        else:
-            fail_count += 1
+    success_count = sum(1 for ok in results if ok)
+    fail_count = total_count - success_count
 
     logger.info("\n" + "=" * 60)
     logger.info(f"迁移完成！")
@@ -7,27 +7,32 @@ Web: /contributor/*
 
 import os
 import re
-import json
 import shutil
 import sqlite3
 import hashlib
+import hmac
 import secrets
+import string
+import tempfile
 import zipfile
 import io
 import asyncio
 import unicodedata
+from collections import OrderedDict
 from pathlib import Path
 from datetime import datetime, timezone, timedelta
-from typing import Optional
+from typing import Callable, Optional
 from contextlib import asynccontextmanager
 
 import aiosqlite
+import orjson
 import zstandard as zstd
 
 from fastapi import FastAPI, HTTPException, Depends, Request, UploadFile, File, Form, Query
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import ORJSONResponse, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
+from starlette.datastructures import UploadFile as StarletteUploadFile
 from pydantic import BaseModel, Field, EmailStr
 import jwt
 import logging
@@ -55,6 +60,13 @@ if not JWT_SECRET:
         "Example: JWT_SECRET=$(python -c 'import secrets; print(secrets.token_hex(32))')"
     )
 JWT_ALGORITHM = "HS256"
+# Authorization 头前缀
+AUTH_PREFIX = "Bearer "
+
+# 词典 ID 允许的字符（1-64 位字母、数字、下划线或连字符）
+_DICT_ID_CHARS = frozenset(string.ascii_letters + string.digits + "_-")
+# 用户名格式（模块加载时编译一次）
+_USERNAME_RE = re.compile(r"^[a-zA-Z0-9_]{3,32}$")
 
 # api 服务地址（同一 docker network 内）
 API_INTERNAL_URL = os.environ.get("API_INTERNAL_URL", "http://api:8080")
@@ -65,6 +77,8 @@ MAX_METADATA_FILE_SIZE = int(os.environ.get("MAX_METADATA_FILE_SIZE", 5 * 1024 *
 MAX_DICTIONARY_FILE_SIZE = int(os.environ.get("MAX_DICTIONARY_FILE_SIZE", 2 * 1024 * 1024 * 1024))  # 2GB
 MAX_MEDIA_FILE_SIZE = int(os.environ.get("MAX_MEDIA_FILE_SIZE", 4 * 1024 * 1024 * 1024))  # 4GB
 MAX_ENTRIES_FILE_SIZE = int(os.environ.get("MAX_ENTRIES_FILE_SIZE", 500 * 1024 * 1024))  # 500MB (compressed)
+# 上传文件写入磁盘时每次读取的块大小
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 REQUIRED_FILES = {"metadata.json", "dictionary.db", "logo.png"}
 
@@ -81,10 +95,35 @@ async def invalidate_api_dict_cache(dict_id: str) -> None:
         logger.warning(f"[cache] failed to invalidate api cache for '{dict_id}': {e}")
 OPTIONAL_FILES = {"media.db"}
 ALLOWED_FILES = REQUIRED_FILES | OPTIONAL_FILES
-METADATA_REQUIRED_KEYS = {"id", "name", "source_language", "target_language"}
+METADATA_REQUIRED_KEYS = frozenset({"id", "name", "source_language", "target_language"})
+# upsert 词条时可写入的 entries 列（entry_id 为主键且必须在首位；dictionary.db 中不存在的其他列会被跳过）
+ENTRY_COLUMNS = ("entry_id", "headword", "headword_normalized", "entry_type", "page", "section", "version", "json_data")
+# SQLite IN (...) 查询每批的参数数量（低于 SQLITE_MAX_VARIABLE_NUMBER 的旧默认值 999）
+SQLITE_IN_CHUNK_SIZE = 900
+# 词条 json_data 的 zstd 压缩级别
+ENTRY_COMPRESSION_LEVEL = 7
 
 # 全局 user.db 连接（在 lifespan 中初始化和关闭）
 _user_db_conn: Optional[aiosqlite.Connection] = None
+# 已验证 token 的缓存：命中时跳过 jwt.decode 和 users 表查询
+# 格式: {token: (过期时间戳, 用户信息)}，按最近使用排序，最多 TOKEN_CACHE_SIZE 条
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TTL = 60  # 秒
+_token_cache: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+# user.db 连接的 PRAGMA
+# user.db 只在服务端使用（不像 dictionary.db / media.db 会被客户端下载），可以使用 WAL 模式
+USER_DB_PRAGMAS = """
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA mmap_size=268435456;
+    PRAGMA busy_timeout=5000;
+"""
+# 词条压缩用的 zstd 字典缓存（None 表示该词典不使用字典），替换 dictionary.db 或删除词典时清除
+_zstd_dicts: dict[str, Optional[zstd.ZstdCompressionDict]] = {}
+# 词条 upsert 语句缓存（同上）
+# 格式: {dict_id: (写入的列, INSERT ... ON CONFLICT 语句)}
+_entry_upsert_sql: dict[str, tuple[list[str], str]] = {}
 
 
 class UserRegister(BaseModel):
@@ -154,25 +193,33 @@ async def lifespan(app: FastAPI):
     global _user_db_conn
     _user_db_conn = await aiosqlite.connect(str(DB_PATH))
     _user_db_conn.row_factory = aiosqlite.Row
+    await _user_db_conn.executescript(USER_DB_PRAGMAS)
     await init_db()
     yield
     await _user_db_conn.close()
     _user_db_conn = None
 
 
+def _password_digest(salt: str, password: str) -> bytes:
+    return hashlib.sha256(salt.encode() + b":" + password.encode()).digest()
+
+
 def hash_password(password: str, salt: str | None = None) -> str:
     if salt is None:
         salt = secrets.token_hex(16)
-    digest = hashlib.sha256(f"{salt}:{password}".encode()).hexdigest()
-    return f"{salt}:{digest}"
+    return f"{salt}:{_password_digest(salt, password).hex()}"
 
 
 def verify_password(stored: str, password: str) -> bool:
-    parts = stored.split(":", 1)
-    if len(parts) != 2:
+    salt, sep, digest_hex = stored.partition(":")
+    if not sep:
+        return False
+    try:
+        stored_digest = bytes.fromhex(digest_hex)
+    except ValueError:
         return False
-    salt, _ = parts
-    return secrets.compare_digest(stored, hash_password(password, salt))
+    # 直接比较原始摘要字节，不再拼接并比较整个十六进制字符串
+    return hmac.compare_digest(stored_digest, _password_digest(salt, password))
 
 
 def create_token(user_id: int, username: str) -> str:
@@ -191,9 +238,16 @@ def verify_token(token: str) -> Optional[dict]:
 
 async def get_current_user(request: Request) -> dict:
     auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
+    if not auth_header or not auth_header.startswith(AUTH_PREFIX):
         raise HTTPException(status_code=401, detail="Missing or invalid Authorization header")
-    token = auth_header[7:]
+    token = auth_header[len(AUTH_PREFIX):]
+    cached = _token_cache.get(token)
+    if cached is not None:
+        if cached[0] > time.time():
+            _token_cache.move_to_end(token)
+            return dict(cached[1])
+        del _token_cache[token]
+
     payload = verify_token(token)
     user_id = int(payload["sub"])
     conn = get_db()
@@ -205,6 +259,13 @@ async def get_current_user(request: Request) -> dict:
     await cursor.close()
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
+    user = dict(user)
+
+    # 缓存时间不超过 token 自身的过期时间
+    expires_at = min(time.time() + TOKEN_CACHE_TTL, payload.get("exp", float("inf")))
+    _token_cache[token] = (expires_at, user)
+    if len(_token_cache) > TOKEN_CACHE_SIZE:
+        _token_cache.popitem(last=False)
     return dict(user)
 
 
@@ -216,8 +277,68 @@ def dict_dir(dict_id: str) -> Path:
     return DICTS_PATH / dict_id
 
 
+def _copy_upload(
+    fileobj, dest: Path, max_size: int, too_large_detail: str,
+    validate: Optional[Callable[[Path], None]] = None,
+) -> int:
+    """
+    把上传的临时文件分块复制到 dest（同步函数，在线程池中执行）
+
+    先写入同目录下的临时文件（mkstemp 每次唯一，同一文件的并发上传互不干扰），
+    经 validate 校验后 os.replace 替换，已打开旧文件的读连接始终看到完整的旧内容。
+    超过 max_size 时直接抛出 413，不写入任何内容；validate 抛出异常时删除临时文件并原样抛出。
+
+    Returns:
+        写入的字节数
+    """
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    if size > max_size:
+        raise HTTPException(status_code=413, detail=too_large_detail)
+
+    fd, tmp_name = tempfile.mkstemp(dir=dest.parent, prefix=dest.name + ".")
+    tmp_path = Path(tmp_name)
+    try:
+        # mkstemp 创建的文件权限为 0600，改为普通文件的 0644，nginx 等其他用户仍可读取
+        os.fchmod(fd, 0o644)
+        with open(fd, "wb") as fh:
+            shutil.copyfileobj(fileobj, fh, UPLOAD_CHUNK_SIZE)
+        if validate is not None:
+            validate(tmp_path)
+        os.replace(tmp_path, dest)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return size
+
+
+async def save_upload(
+    upload: UploadFile, dest: Path, max_size: int, too_large_detail: str,
+    validate: Optional[Callable[[Path], None]] = None,
+) -> int:
+    """
+    把上传文件写入 dest，不把整个文件读入内存
+
+    Starlette 已把上传内容缓存在 upload.file（超过 1MB 时落盘），直接在线程中整体复制，
+    避免逐块在事件循环和线程池之间来回切换。
+
+    Returns:
+        写入的字节数
+    """
+    return await asyncio.to_thread(_copy_upload, upload.file, dest, max_size, too_large_detail, validate)
+
+
+def _test_zip(path: Path) -> None:
+    """逐个校验 zip 内文件的 CRC（同步，需在线程中调用），损坏时抛出 zipfile.BadZipFile"""
+    with zipfile.ZipFile(path, 'r') as zf:
+        bad_name = zf.testzip()
+    if bad_name is not None:
+        raise zipfile.BadZipFile(f"Bad CRC for {bad_name}")
+
+
 def validate_dict_id(dict_id: str) -> bool:
-    return bool(re.match(r"^[a-zA-Z0-9_\-]{1,64}$", dict_id))
+    return 0 < len(dict_id) <= 64 and _DICT_ID_CHARS.issuperset(dict_id)
 
 
 def dict_id_exists(dict_id: str) -> bool:
@@ -226,25 +347,49 @@ def dict_id_exists(dict_id: str) -> bool:
 
 def parse_metadata(path: Path) -> dict:
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return orjson.loads(path.read_bytes())
     except Exception as e:
         logger.error(f"Failed to parse metadata.json: {e}")
         return {}
 
 
-def validate_metadata_keys(meta: dict) -> list:
-    return sorted(METADATA_REQUIRED_KEYS - meta.keys())
+def parse_and_validate_meta(meta_content: bytes) -> tuple[dict, str, str]:
+    """
+    解析并校验上传的 metadata.json（大小、JSON 格式、必需键、version 类型）
 
+    Returns:
+        (metadata, dict_id, 显示名称)
 
-def validate_metadata_version(meta: dict) -> Optional[str]:
+    Raises:
+        HTTPException: 任一校验失败
+    """
+    if len(meta_content) > MAX_METADATA_FILE_SIZE:
+        raise HTTPException(status_code=413, detail=f"Metadata file too large (max {MAX_METADATA_FILE_SIZE / 1024 / 1024:.0f}MB)")
+    try:
+        meta = orjson.loads(meta_content)
+    except Exception as e:
+        logger.error(f"Failed to parse metadata.json: {e}")
+        raise HTTPException(status_code=400, detail="Invalid metadata.json")
+    if not isinstance(meta, dict):
+        raise HTTPException(status_code=400, detail="Invalid metadata.json")
+
+    missing = METADATA_REQUIRED_KEYS.difference(meta)
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing required keys: {sorted(missing)}")
     if "version" in meta and not isinstance(meta["version"], int):
-        return "version must be an integer"
-    return None
+        raise HTTPException(status_code=400, detail="version must be an integer")
+
+    dict_id = str(meta["id"]).strip()
+    display_name = (meta.get("name") or "").strip() or dict_id
+    return meta, dict_id, display_name
 
 
 def _normalize_headword(headword: str) -> str:
-    nfd = unicodedata.normalize("NFD", headword.lower())
+    lowered = headword.lower()
+    # 纯 ASCII 不含组合字符，NFD 分解后不变，直接返回
+    if lowered.isascii():
+        return lowered
+    nfd = unicodedata.normalize("NFD", lowered)
     return "".join(ch for ch in nfd if unicodedata.category(ch) != "Mn")
 
 
@@ -259,62 +404,194 @@ def _get_zstd_dict(db_path: Path) -> bytes | None:
         return None
 
 
-def compress_entry(data: bytes, zdict_bytes: bytes | None) -> bytes:
-    if zdict_bytes:
-        zdict = zstd.ZstdCompressionDict(zdict_bytes)
-        cctx = zstd.ZstdCompressor(level=7, dict_data=zdict)
-    else:
-        cctx = zstd.ZstdCompressor(level=7)
-    return cctx.compress(data)
+def clear_dict_write_caches(dict_id: str) -> None:
+    """清除词典的 zstd 字典和 upsert 语句缓存（替换 dictionary.db 或删除词典后调用）"""
+    _zstd_dicts.pop(dict_id, None)
+    _entry_upsert_sql.pop(dict_id, None)
 
 
-def upsert_entry_in_db(db_path: Path, entry_json: dict, zdict_bytes: bytes | None = None) -> str:
-    """将单个词条 upsert 进 dictionary.db。zdict_bytes 可由调用方预先获取并传入，避免重复查询 config 表。"""
+def get_entry_compressor(dict_id: str) -> zstd.ZstdCompressor:
+    """
+    返回压缩该词典词条用的 ZstdCompressor
+
+    zstd 字典按词典缓存并预先构建（替换 dictionary.db 或删除词典时清除）；
+    ZstdCompressor 不是线程安全的，每批写入新建一个，在整批词条间复用。
+    """
+    if dict_id not in _zstd_dicts:
+        zdict_bytes = _get_zstd_dict(dict_dir(dict_id) / "dictionary.db")
+        zdict = None
+        if zdict_bytes:
+            zdict = zstd.ZstdCompressionDict(zdict_bytes)
+            zdict.precompute_compress(level=ENTRY_COMPRESSION_LEVEL)
+        _zstd_dicts[dict_id] = zdict
+    # 词条都很小：帧头写入内容大小（解压时一次分配），不写 4 字节的校验和
+    return zstd.ZstdCompressor(
+        level=ENTRY_COMPRESSION_LEVEL, dict_data=_zstd_dicts[dict_id],
+        write_content_size=True, write_checksum=False,
+    )
+
+
+def _entry_row(entry_json: dict, columns: list[str], cctx: zstd.ZstdCompressor) -> list:
+    """把单个词条转换为 entries 表一行（按 columns 顺序），json_data 为压缩后的词条 JSON"""
     entry_id = entry_json.get("entry_id")
     if entry_id is not None:
         entry_id = int(entry_id)
-    compressed = compress_entry(
-        json.dumps(entry_json, ensure_ascii=False).encode("utf-8"), zdict_bytes
-    )
-    conn = sqlite3.connect(str(db_path))
+    headword = str(entry_json.get("headword", ""))
+    headword_normalized = _normalize_headword(headword)
+    col_map = {
+        "entry_id": entry_id,
+        "headword": headword or None,
+        "headword_normalized": headword_normalized or None,
+        "entry_type": str(entry_json.get("entry_type", "")) or None,
+        "page": str(entry_json.get("page", "")) or None,
+        "section": str(entry_json.get("section", "")) or None,
+        "version": str(entry_json.get("version", "")) or None,
+        "json_data": cctx.compress(orjson.dumps(entry_json)),
+    }
+    return [col_map[c] for c in columns]
+
+
+def bulk_write_entries(dict_id: str, upsert_entries: list[dict], delete_entry_ids: list[int]) -> set[int]:
+    """
+    在一个连接、一个事务中删除并 upsert 词条（同步函数，在线程池中执行）
+
+    已存在的词条只更新 json_data，新词条写入全部已知列。
+
+    Returns:
+        写入前已存在的 upsert 词条 entry_id，用于区分 insert 和 update
+    """
+    conn = sqlite3.connect(str(dict_dir(dict_id) / "dictionary.db"), isolation_level=None)
     try:
-        cur = conn.execute("PRAGMA table_info(entries)")
-        columns = [row[1] for row in cur.fetchall()]
-        existing = None
-        if entry_id is not None:
-            row = conn.execute(
-                "SELECT entry_id FROM entries WHERE entry_id = ?", (entry_id,)
-            ).fetchone()
-            existing = row
-        if existing:
-            conn.execute("UPDATE entries SET json_data = ? WHERE entry_id = ?", (compressed, entry_id))
-            conn.commit()
-            return "updated"
-        else:
-            headword = str(entry_json.get("headword", ""))
-            headword_normalized = _normalize_headword(headword)
-            col_map = {
-                "entry_id": entry_id,
-                "headword": headword or None,
-                "headword_normalized": headword_normalized or None,
-                "entry_type": str(entry_json.get("entry_type", "")) or None,
-                "page": str(entry_json.get("page", "")) or None,
-                "section": str(entry_json.get("section", "")) or None,
-                "version": str(entry_json.get("version", "")) or None,
-                "json_data": compressed,
-            }
-            insert_cols = [c for c in columns if c in col_map]
-            values = [col_map[c] for c in insert_cols]
-            placeholders = ", ".join("?" * len(insert_cols))
-            col_names = ", ".join(insert_cols)
-            conn.execute(f"INSERT INTO entries ({col_names}) VALUES ({placeholders})", values)
-            conn.commit()
-            return "inserted"
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        cached = _entry_upsert_sql.get(dict_id)
+        if cached is None:
+            table_columns = {row[1] for row in conn.execute("PRAGMA table_info(entries)")}
+            columns = [c for c in ENTRY_COLUMNS if c in table_columns]
+            sql = f"""INSERT INTO entries ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})
+                      ON CONFLICT(entry_id) DO UPDATE SET json_data = excluded.json_data"""
+            cached = _entry_upsert_sql[dict_id] = (columns, sql)
+        columns, sql = cached
+        # 压缩在开启写事务之前完成
+        cctx = get_entry_compressor(dict_id) if upsert_entries else None
+        rows = [_entry_row(entry, columns, cctx) for entry in upsert_entries]
+        upsert_ids = [row[0] for row in rows if row[0] is not None]
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            existing_eids = set()
+            for start in range(0, len(upsert_ids), SQLITE_IN_CHUNK_SIZE):
+                chunk = upsert_ids[start:start + SQLITE_IN_CHUNK_SIZE]
+                placeholders = ",".join("?" * len(chunk))
+                existing_eids.update(
+                    row[0] for row in conn.execute(
+                        f"SELECT entry_id FROM entries WHERE entry_id IN ({placeholders})", chunk
+                    )
+                )
+            if delete_entry_ids:
+                conn.executemany("DELETE FROM entries WHERE entry_id = ?", [(eid,) for eid in delete_entry_ids])
+            if rows:
+                conn.executemany(sql, rows)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return existing_eids
     finally:
         conn.close()
 
 
+def check_zstd_frames_complete(fileobj, size: int) -> None:
+    """
+    按 zstd 帧格式逐帧、逐块跳读（不解压），确认文件由完整的帧组成
+
+    stream_reader 遇到截断的最后一帧时直接返回 EOF 而不报错，
+    不提前检查的话，上传中断的文件会只应用前半部分词条。
+
+    Raises:
+        zstd.ZstdError: 帧头无效或文件在帧中途结束
+    """
+    pos = 0
+    while pos < size:
+        fileobj.seek(pos)
+        # 帧头最长 18 字节
+        header = fileobj.read(18)
+        if len(header) >= 8 and int.from_bytes(header[:4], "little") & 0xFFFFFFF0 == 0x184D2A50:
+            # 可跳过帧：4 字节 magic + 4 字节长度 + 内容
+            pos += 8 + int.from_bytes(header[4:8], "little")
+            continue
+        has_checksum = zstd.get_frame_parameters(header).has_checksum
+        pos += zstd.frame_header_size(header)
+        last_block = False
+        while not last_block:
+            fileobj.seek(pos)
+            block_header = fileobj.read(3)
+            if len(block_header) < 3:
+                break
+            value = int.from_bytes(block_header, "little")
+            last_block = bool(value & 1)
+            # 块类型 1（RLE）的内容只有 1 字节，其余类型为块大小
+            pos += 3 + (1 if (value >> 1) & 3 == 1 else value >> 3)
+        if not last_block:
+            raise zstd.ZstdError("incomplete zstd frame (file truncated?)")
+        if has_checksum:
+            pos += 4
+    if pos != size:
+        raise zstd.ZstdError("incomplete zstd frame (file truncated?)")
+
+
+def parse_entries_upload(fileobj) -> tuple[list[dict], list[int]]:
+    """
+    流式解压 .zst 词条文件并逐行解析（同步函数，在线程池中执行）
+
+    每行一个词条 JSON，带 "_delete" 的行表示删除该 entry_id。
+
+    Returns:
+        (需要 upsert 的词条, 需要删除的 entry_id)
+    """
+    # Validate compressed file size
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    if size > MAX_ENTRIES_FILE_SIZE:
+        raise HTTPException(status_code=413, detail=f"Entries file too large (max {MAX_ENTRIES_FILE_SIZE / 1024 / 1024:.0f}MB)")
+    if size == 0:
+        raise HTTPException(status_code=400, detail="Failed to decompress file: empty file")
+    check_zstd_frames_complete(fileobj, size)
+    fileobj.seek(0)
+
+    upsert_entries = []
+    delete_entry_ids = []
+    decompressed_size = 0
+    reader = zstd.ZstdDecompressor().stream_reader(fileobj, read_across_frames=True, closefd=False)
+    line_no = 0
+    with io.BufferedReader(reader, UPLOAD_CHUNK_SIZE) as lines:
+        # readline 限制长度，单行过长时也不会超出解压大小上限读入内存
+        while line := lines.readline(MAX_DICTIONARY_FILE_SIZE - decompressed_size + 1):
+            line_no += 1
+            # Validate decompressed size (limit to prevent zip bomb attacks)
+            decompressed_size += len(line)
+            if decompressed_size > MAX_DICTIONARY_FILE_SIZE:
+                raise HTTPException(status_code=413, detail="Decompressed entries data too large")
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = orjson.loads(line)
+            except Exception:
+                raise HTTPException(status_code=400, detail=f"Invalid JSON at line {line_no}")
+            if entry.get("_delete"):
+                eid = entry.get("entry_id")
+                if eid is None:
+                    raise HTTPException(status_code=400, detail=f"Missing entry_id for _delete entry at line {line_no}")
+                delete_entry_ids.append(int(eid))
+            else:
+                upsert_entries.append(entry)
+    return upsert_entries, delete_entry_ids
+
+
 async def next_version(dict_id: str) -> int:
+    # idx_vh_dict_version(dict_id, version) 让 MAX(version) 走覆盖索引的单次查找（min/max 优化），不随版本数增长
     conn = get_db()
     cursor = await conn.execute(
         "SELECT MAX(version) FROM version_history WHERE dict_id = ?", (dict_id,)
@@ -324,19 +601,28 @@ async def next_version(dict_id: str) -> int:
     return (row[0] or 0) + 1
 
 
-async def record_version(dict_id: str, version: int, message: str, change_type: str, file_name: str, entry_id: int | None = None):
+async def record_versions_bulk(rows: list[tuple]) -> None:
+    """
+    批量写入版本记录（一次 executemany，一次提交）
+
+    Args:
+        rows: [(dict_id, version, message, change_type, file_name, entry_id), ...]
+    """
+    if not rows:
+        return
     now = datetime.now(timezone.utc).isoformat()
     conn = get_db()
-    await conn.execute(
+    await conn.executemany(
         """INSERT INTO version_history
            (dict_id, version, message, change_type, file_name, entry_id, created_at)
            VALUES (?,?,?,?,?,?,?)""",
-        (dict_id, version, message, change_type, file_name, entry_id, now)
+        [(*row, now) for row in rows]
     )
     await conn.commit()
 
 
-app = FastAPI(title="EasyDict User API", description="用户认证、设置同步和词典管理", version="1.0.0", lifespan=lifespan)
+app = FastAPI(title="EasyDict User API", description="用户认证、设置同步和词典管理", version="1.0.0", lifespan=lifespan,
+              default_response_class=ORJSONResponse)
 
 
 @app.exception_handler(RequestValidationError)
@@ -350,12 +636,12 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         detail = f"{field}: {msg}" if field else msg
     else:
         detail = "Validation error"
-    return JSONResponse(status_code=422, content={"detail": detail})
+    return ORJSONResponse(status_code=422, content={"detail": detail})
 
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
-    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
+    return ORJSONResponse(status_code=exc.status_code, content={"detail": exc.detail})
 
 
 app.add_middleware(
@@ -376,21 +662,20 @@ async def health_check():
 
 @app.post("/user/register", response_model=TokenResponse)
 async def register(data: UserRegister):
-    if not re.match(r"^[a-zA-Z0-9_]{3,32}$", data.username):
+    if not _USERNAME_RE.match(data.username):
         raise HTTPException(status_code=400, detail="Username must be 3-32 letters, numbers or underscores")
     now = datetime.now(timezone.utc).isoformat()
     hashed = hash_password(data.password)
     conn = get_db()
     try:
-        await conn.execute(
+        user_cursor = await conn.execute(
             "INSERT INTO users (username, email, password, created_at) VALUES (?,?,?,?)",
             (data.username, data.email.lower(), hashed, now)
         )
-        await conn.commit()
-        user_cursor = await conn.execute("SELECT id FROM users WHERE username = ?", (data.username,))
-        user_row = await user_cursor.fetchone()
+        # 新用户 id 直接取自 INSERT 的 lastrowid，无需再查询一次
+        user_id = user_cursor.lastrowid
         await user_cursor.close()
-        user_id = user_row[0]
+        await conn.commit()
     except sqlite3.IntegrityError as e:
         if "username" in str(e):
             raise HTTPException(status_code=400, detail="Username already exists")
@@ -434,12 +719,17 @@ async def get_me(user: dict = Depends(get_current_user)):
 @app.get("/user/settings")
 async def download_settings(user: dict = Depends(get_current_user)):
     zip_path = get_settings_zip_path(user["id"])
-    if not zip_path.exists():
+    # 只 stat 一次：既判断文件是否存在，也交给 FileResponse 生成 Content-Length
+    try:
+        stat_result = zip_path.stat()
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Settings not found")
-    return StreamingResponse(
-        iter([zip_path.read_bytes()]),
+    return FileResponse(
+        path=str(zip_path),
+        stat_result=stat_result,
         media_type="application/zip",
-        headers={"Content-Disposition": f'attachment; filename="{user["id"]}.zip"', "Cache-Control": "no-cache"}
+        filename=f'{user["id"]}.zip',
+        headers={"Cache-Control": "no-cache"}
     )
 
 
@@ -452,20 +742,16 @@ async def upload_settings(user: dict = Depends(get_current_user), file: UploadFi
     if file.size is not None and file.size > MAX_SETTINGS_FILE_SIZE:
         raise HTTPException(status_code=413, detail=f"Settings file too large (max {MAX_SETTINGS_FILE_SIZE / 1024 / 1024:.0f}MB)")
     
-    zip_path = get_settings_zip_path(user["id"])
-    content = await file.read()
-    
-    # Additional size check on actual content
-    if len(content) > MAX_SETTINGS_FILE_SIZE:
-        raise HTTPException(status_code=413, detail=f"Settings file too large (max {MAX_SETTINGS_FILE_SIZE / 1024 / 1024:.0f}MB)")
-    
+    # 临时文件校验通过后才替换旧的设置文件
     try:
-        with zipfile.ZipFile(io.BytesIO(content), 'r') as zf:
-            zf.testzip()
+        size = await save_upload(
+            file, get_settings_zip_path(user["id"]), MAX_SETTINGS_FILE_SIZE,
+            f"Settings file too large (max {MAX_SETTINGS_FILE_SIZE / 1024 / 1024:.0f}MB)",
+            validate=_test_zip,
+        )
     except zipfile.BadZipFile:
         raise HTTPException(status_code=400, detail="Invalid zip file")
-    zip_path.write_bytes(content)
-    return {"success": True, "size": len(content), "updated_at": datetime.now(timezone.utc).isoformat()}
+    return {"success": True, "size": size, "updated_at": datetime.now(timezone.utc).isoformat()}
 
 
 @app.delete("/user/settings")
@@ -500,9 +786,12 @@ async def delete_dict(dict_id: str, user: dict = Depends(get_current_user)):
     await d_cursor.close()
     if not d:
         raise HTTPException(status_code=404, detail="Dict not found")
-    shutil.rmtree(dict_dir(dict_id), ignore_errors=True)
+    await asyncio.to_thread(shutil.rmtree, dict_dir(dict_id), ignore_errors=True)
     await conn.execute("DELETE FROM dicts WHERE dict_id = ?", (dict_id,))
     await conn.commit()
+    clear_dict_write_caches(dict_id)
+    # 词典已删除，让 api 服务关闭其连接池并清除缓存
+    await invalidate_api_dict_cache(dict_id)
     return {"success": True}
 
 
@@ -550,8 +839,7 @@ async def get_updates_batch(request: Request):
             await ver_cursor.close()
             to_ver = row[0] if row and row[0] is not None else 0
 
-        history = await _get_history_between(dict_id, from_ver, to_ver or 0)
-        required = await _compute_required_files(dict_id, from_ver, to_ver or 0)
+        history, required = await _compute_update_between(dict_id, from_ver, to_ver or 0)
 
         results.append({
             "dict_id": dict_id,
@@ -593,27 +881,8 @@ async def create_dict_impl(
     if media_file and media_file.filename and media_file.size is not None and media_file.size > MAX_MEDIA_FILE_SIZE:
         raise HTTPException(status_code=413, detail=f"Media file too large (max {MAX_MEDIA_FILE_SIZE / 1024 / 1024 / 1024:.0f}GB)")
 
-    try:
-        meta_content = await metadata_file.read()
-        # Additional size check on actual content
-        if len(meta_content) > MAX_METADATA_FILE_SIZE:
-            raise HTTPException(status_code=413, detail=f"Metadata file too large (max {MAX_METADATA_FILE_SIZE / 1024 / 1024:.0f}MB)")
-        meta = json.loads(meta_content.decode("utf-8"))
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Failed to parse metadata.json: {e}")
-        raise HTTPException(status_code=400, detail="Invalid metadata.json")
-
-    missing = validate_metadata_keys(meta)
-    if missing:
-        raise HTTPException(status_code=400, detail=f"Missing required keys: {missing}")
-
-    version_error = validate_metadata_version(meta)
-    if version_error:
-        raise HTTPException(status_code=400, detail=version_error)
-
-    dict_id = str(meta.get("id", "")).strip()
+    meta_content = await metadata_file.read()
+    _, dict_id, display_name = parse_and_validate_meta(meta_content)
     if not validate_dict_id(dict_id):
         raise HTTPException(status_code=400, detail="Invalid dict_id format. dict_id must match pattern: ^[a-zA-Z0-9_\\-]{1,64}$")
 
@@ -632,26 +901,23 @@ async def create_dict_impl(
     try:
         (target_dir / "metadata.json").write_bytes(meta_content)
         
-        dictionary_data = await dictionary_file.read()
-        if len(dictionary_data) > MAX_DICTIONARY_FILE_SIZE:
-            raise HTTPException(status_code=413, detail=f"Dictionary file too large (max {MAX_DICTIONARY_FILE_SIZE / 1024 / 1024:.0f}MB)")
-        (target_dir / "dictionary.db").write_bytes(dictionary_data)
-        
-        logo_data = await logo_file.read()
-        if len(logo_data) > MAX_METADATA_FILE_SIZE:
-            raise HTTPException(status_code=413, detail="Logo file too large")
-        (target_dir / "logo.png").write_bytes(logo_data)
-        
+        await save_upload(
+            dictionary_file, target_dir / "dictionary.db", MAX_DICTIONARY_FILE_SIZE,
+            f"Dictionary file too large (max {MAX_DICTIONARY_FILE_SIZE / 1024 / 1024:.0f}MB)"
+        )
+        await save_upload(logo_file, target_dir / "logo.png", MAX_METADATA_FILE_SIZE, "Logo file too large")
+
         if media_file and media_file.filename:
-            media_data = await media_file.read()
-            if len(media_data) > MAX_MEDIA_FILE_SIZE:
-                raise HTTPException(status_code=413, detail=f"Media file too large (max {MAX_MEDIA_FILE_SIZE / 1024 / 1024 / 1024:.0f}GB)")
-            (target_dir / "media.db").write_bytes(media_data)
+            # api 服务以 immutable 方式读取 media.db，只能整体替换（save_upload 通过 os.replace），不能原地改写
+            await save_upload(
+                media_file, target_dir / "media.db", MAX_MEDIA_FILE_SIZE,
+                f"Media file too large (max {MAX_MEDIA_FILE_SIZE / 1024 / 1024 / 1024:.0f}GB)"
+            )
             has_media = True
 
+        clear_dict_write_caches(dict_id)
         await invalidate_api_dict_cache(dict_id)
 
-        display_name = (meta.get("name") or "").strip() or dict_id
         now = datetime.now(timezone.utc).isoformat()
         await conn.execute(
             "INSERT INTO dicts (dict_id, user_id, name, has_media, created_at, updated_at) VALUES (?,?,?,?,?,?)",
@@ -659,36 +925,44 @@ async def create_dict_impl(
         )
         await conn.commit()
         ver = await next_version(dict_id)
-        for fname in ["metadata.json", "dictionary.db", "logo.png"]:
-            await record_version(dict_id, ver, message, "file", fname)
-        if has_media:
-            await record_version(dict_id, ver, message, "file", "media.db")
+        file_names = ["metadata.json", "dictionary.db", "logo.png"] + (["media.db"] if has_media else [])
+        await record_versions_bulk([(dict_id, ver, message, "file", fname, None) for fname in file_names])
 
         return {"success": True, "dict_id": dict_id, "name": display_name}
     except Exception as e:
-        shutil.rmtree(target_dir, ignore_errors=True)
+        await asyncio.to_thread(shutil.rmtree, target_dir, ignore_errors=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def split_upload_form(form) -> tuple[dict[str, StarletteUploadFile], dict[str, str]]:
+    """
+    遍历一次 multipart 表单，拆分为文件字段和非空的普通字段（同名字段以最后一个为准）
+
+    Returns:
+        (文件字段, 普通字段)
+    """
+    files: dict[str, StarletteUploadFile] = {}
+    fields: dict[str, str] = {}
+    for name, val in form.multi_items():
+        if isinstance(val, StarletteUploadFile):
+            files[name] = val
+        elif val:
+            fields[name] = val
+    return files, fields
+
+
 @app.post("/")
 async def upload_create_dict(request: Request, user: dict = Depends(get_current_user)):
     form = await request.form()
     field_names = list(form.keys())
     logger.info(f"[upload_create_dict] received fields: {field_names}")
 
-    def _get_file(name):
-        val = form.get(name)
-        return val if (val and hasattr(val, 'filename')) else None
-
-    def _get_str(name, default=None):
-        val = form.get(name)
-        return str(val) if val and not hasattr(val, 'filename') else default
-
-    metadata_file = _get_file("metadata_file")
-    dictionary_file = _get_file("dictionary_file")
-    logo_file = _get_file("logo_file")
-    media_file = _get_file("media_file")
-    message = _get_str("message", "初始上传")
+    files, fields = split_upload_form(form)
+    metadata_file = files.get("metadata_file")
+    dictionary_file = files.get("dictionary_file")
+    logo_file = files.get("logo_file")
+    media_file = files.get("media_file")
+    message = fields.get("message", "初始上传")
 
     missing = [n for n, f in [("metadata_file", metadata_file), ("dictionary_file", dictionary_file), ("logo_file", logo_file)] if f is None]
     if missing:
@@ -742,54 +1016,37 @@ async def update_dict_impl(
         if metadata_file and metadata_file.filename:
             logger.info(f"[update_dict_impl] reading metadata_file elapsed={time.time()-t0:.1f}s")
             meta_content = await metadata_file.read()
-            # Validate file size
-            if len(meta_content) > MAX_METADATA_FILE_SIZE:
-                raise HTTPException(status_code=413, detail=f"Metadata file too large (max {MAX_METADATA_FILE_SIZE / 1024 / 1024:.0f}MB)")
             logger.info(f"[update_dict_impl] metadata_file read done size={len(meta_content)} elapsed={time.time()-t0:.1f}s")
-            meta = json.loads(meta_content.decode("utf-8"))
-            missing = validate_metadata_keys(meta)
-            if missing:
-                raise HTTPException(status_code=400, detail=f"Missing required keys: {missing}")
-            version_error = validate_metadata_version(meta)
-            if version_error:
-                raise HTTPException(status_code=400, detail=version_error)
-            new_dict_id = str(meta.get("id", "")).strip()
+            _, new_dict_id, new_display_name = parse_and_validate_meta(meta_content)
             if new_dict_id != dict_id:
                 raise HTTPException(status_code=400, detail=f"metadata.id ({new_dict_id}) must match dict_id ({dict_id})")
             (target_dir / "metadata.json").write_bytes(meta_content)
-            display_name = (meta.get("name") or "").strip() or dict_id
+            display_name = new_display_name
             updated_files.append("metadata.json")
 
         if dictionary_file and dictionary_file.filename:
-            logger.info(f"[update_dict_impl] reading dictionary_file elapsed={time.time()-t0:.1f}s")
-            data = await dictionary_file.read()
-            # Validate file size
-            if len(data) > MAX_DICTIONARY_FILE_SIZE:
-                raise HTTPException(status_code=413, detail=f"Dictionary file too large (max {MAX_DICTIONARY_FILE_SIZE / 1024 / 1024:.0f}MB)")
-            logger.info(f"[update_dict_impl] dictionary_file read done size={len(data)} elapsed={time.time()-t0:.1f}s")
-            (target_dir / "dictionary.db").write_bytes(data)
-            logger.info(f"[update_dict_impl] dictionary_file write done elapsed={time.time()-t0:.1f}s")
+            logger.info(f"[update_dict_impl] saving dictionary_file elapsed={time.time()-t0:.1f}s")
+            size = await save_upload(
+                dictionary_file, target_dir / "dictionary.db", MAX_DICTIONARY_FILE_SIZE,
+                f"Dictionary file too large (max {MAX_DICTIONARY_FILE_SIZE / 1024 / 1024:.0f}MB)"
+            )
+            logger.info(f"[update_dict_impl] dictionary_file write done size={size} elapsed={time.time()-t0:.1f}s")
             updated_files.append("dictionary.db")
 
         if logo_file and logo_file.filename:
-            logger.info(f"[update_dict_impl] reading logo_file elapsed={time.time()-t0:.1f}s")
-            data = await logo_file.read()
-            # Validate file size
-            if len(data) > MAX_METADATA_FILE_SIZE:
-                raise HTTPException(status_code=413, detail="Logo file too large")
-            logger.info(f"[update_dict_impl] logo_file read done size={len(data)} elapsed={time.time()-t0:.1f}s")
-            (target_dir / "logo.png").write_bytes(data)
+            logger.info(f"[update_dict_impl] saving logo_file elapsed={time.time()-t0:.1f}s")
+            size = await save_upload(logo_file, target_dir / "logo.png", MAX_METADATA_FILE_SIZE, "Logo file too large")
+            logger.info(f"[update_dict_impl] logo_file write done size={size} elapsed={time.time()-t0:.1f}s")
             updated_files.append("logo.png")
 
         if media_file and media_file.filename:
-            logger.info(f"[update_dict_impl] reading media_file elapsed={time.time()-t0:.1f}s")
-            data = await media_file.read()
-            # Validate file size
-            if len(data) > MAX_MEDIA_FILE_SIZE:
-                raise HTTPException(status_code=413, detail=f"Media file too large (max {MAX_MEDIA_FILE_SIZE / 1024 / 1024 / 1024:.0f}GB)")
-            logger.info(f"[update_dict_impl] media_file read done size={len(data)} elapsed={time.time()-t0:.1f}s")
-            (target_dir / "media.db").write_bytes(data)
-            logger.info(f"[update_dict_impl] media_file write done elapsed={time.time()-t0:.1f}s")
+            logger.info(f"[update_dict_impl] saving media_file elapsed={time.time()-t0:.1f}s")
+            # api 服务以 immutable 方式读取 media.db，只能整体替换（save_upload 通过 os.replace），不能原地改写
+            size = await save_upload(
+                media_file, target_dir / "media.db", MAX_MEDIA_FILE_SIZE,
+                f"Media file too large (max {MAX_MEDIA_FILE_SIZE / 1024 / 1024 / 1024:.0f}GB)"
+            )
+            logger.info(f"[update_dict_impl] media_file write done size={size} elapsed={time.time()-t0:.1f}s")
             has_media = True
             updated_files.append("media.db")
 
@@ -798,6 +1055,7 @@ async def update_dict_impl(
 
         # dictionary.db 或 media.db 有更新时，统一刷新 api 服务的连接缓存
         if "dictionary.db" in updated_files or "media.db" in updated_files:
+            clear_dict_write_caches(dict_id)
             await invalidate_api_dict_cache(dict_id)
 
         now = datetime.now(timezone.utc).isoformat()
@@ -809,8 +1067,7 @@ async def update_dict_impl(
         await conn.commit()
 
         ver = await next_version(dict_id)
-        for fname in updated_files:
-            await record_version(dict_id, ver, message, "file", fname)
+        await record_versions_bulk([(dict_id, ver, message, "file", fname, None) for fname in updated_files])
 
         logger.info(f"[update_dict_impl] DONE dict_id={dict_id} updated_files={updated_files} total={time.time()-t0:.1f}s")
         return {"success": True, "dict_id": dict_id, "version": ver, "updated_files": updated_files}
@@ -826,24 +1083,17 @@ async def upload_update_dict(dict_id: str, request: Request, user: dict = Depend
     field_names = list(form.keys())
     logger.info(f"[upload_update_dict] dict_id={dict_id} received fields: {field_names}")
 
-    def _get_file(name):
-        val = form.get(name)
-        return val if (val and hasattr(val, 'filename')) else None
-
-    def _get_str(name, default=None):
-        val = form.get(name)
-        return str(val) if val and not hasattr(val, 'filename') else default
-
-    message = _get_str("message", "更新词典")
+    files, fields = split_upload_form(form)
+    message = fields.get("message", "更新词典")
 
     return await update_dict_impl(
         dict_id=dict_id,
         user=user,
         message=message,
-        metadata_file=_get_file("metadata_file"),
-        dictionary_file=_get_file("dictionary_file"),
-        logo_file=_get_file("logo_file"),
-        media_file=_get_file("media_file"),
+        metadata_file=files.get("metadata_file"),
+        dictionary_file=files.get("dictionary_file"),
+        logo_file=files.get("logo_file"),
+        media_file=files.get("media_file"),
     )
 
 
@@ -873,86 +1123,32 @@ async def upsert_dict_entries(
     if not file.filename or not file.filename.endswith(".zst"):
         raise HTTPException(status_code=400, detail="File must be a .zst file")
 
-    content = await file.read()
-    
-    # Validate compressed file size
-    if len(content) > MAX_ENTRIES_FILE_SIZE:
-        raise HTTPException(status_code=413, detail=f"Entries file too large (max {MAX_ENTRIES_FILE_SIZE / 1024 / 1024:.0f}MB)")
-
-    dctx = zstd.ZstdDecompressor()
+    # 解压与解析在线程池中流式进行，不把压缩文件和解压结果整体读入内存
     try:
-        decompressed = dctx.decompress(content)
-        # Validate decompressed size (limit to prevent zip bomb attacks)
-        if len(decompressed) > MAX_DICTIONARY_FILE_SIZE:
-            raise HTTPException(status_code=413, detail="Decompressed entries data too large")
+        upsert_entries, delete_entry_ids = await asyncio.to_thread(parse_entries_upload, file.file)
     except HTTPException:
         raise
-    except Exception as e:
+    except zstd.ZstdError as e:
         raise HTTPException(status_code=400, detail=f"Failed to decompress file: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
     try:
         ver = await next_version(dict_id)
-        upsert_entries = []
-        delete_entry_ids = []
-        for i, line in enumerate(decompressed.decode("utf-8").splitlines()):
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                entry = json.loads(line)
-            except Exception:
-                raise HTTPException(status_code=400, detail=f"Invalid JSON at line {i + 1}")
-            if entry.get("_delete"):
-                eid = entry.get("entry_id")
-                if eid is None:
-                    raise HTTPException(status_code=400, detail=f"Missing entry_id for _delete entry at line {i + 1}")
-                delete_entry_ids.append(int(eid))
-            else:
-                upsert_entries.append(entry)
 
         # 同步 sqlite3 操作放入线程池避免阻塞事件循环
-        def _do_writes():
-            # 首先获取现有的 entry IDs，用于判断是 insert 还是 update
-            existing_eids = set()
-            if upsert_entries or delete_entry_ids:
-                db_conn = sqlite3.connect(str(db_path))
-                try:
-                    cursor = db_conn.execute("SELECT DISTINCT entry_id FROM entries")
-                    existing_eids = {row[0] for row in cursor.fetchall()}
-                finally:
-                    db_conn.close()
-            
-            if delete_entry_ids:
-                db_conn = sqlite3.connect(str(db_path))
-                try:
-                    placeholders = ",".join("?" * len(delete_entry_ids))
-                    db_conn.execute(
-                        f"DELETE FROM entries WHERE entry_id IN ({placeholders})",
-                        delete_entry_ids,
-                    )
-                    db_conn.commit()
-                finally:
-                    db_conn.close()
-            if upsert_entries:
-                # _get_zstd_dict 只调用一次，避免每条 entry 都重新连接 config 表
-                zdict_bytes = _get_zstd_dict(db_path)
-                for entry in upsert_entries:
-                    upsert_entry_in_db(db_path, entry, zdict_bytes)
-            
-            return existing_eids
-
-        existing_eids = await asyncio.to_thread(_do_writes)
+        existing_eids = await asyncio.to_thread(bulk_write_entries, dict_id, upsert_entries, delete_entry_ids)
         await invalidate_api_dict_cache(dict_id)
 
-        for eid in delete_entry_ids:
-            await record_version(dict_id, ver, message, "delete", "dictionary.db", eid)
+        version_rows = [(dict_id, ver, message, "delete", "dictionary.db", eid) for eid in delete_entry_ids]
         for entry in upsert_entries:
             eid = entry.get("entry_id")
             if eid is not None:
                 eid_int = int(eid)
                 # 区分 insert 和 update：如果在执行前不存在，则是 insert；否则是 update
                 change_type = "insert" if eid_int not in existing_eids else "update"
-                await record_version(dict_id, ver, message, change_type, "dictionary.db", eid_int)
+                version_rows.append((dict_id, ver, message, change_type, "dictionary.db", eid_int))
+        await record_versions_bulk(version_rows)
     except HTTPException:
         raise
     except Exception as e:
@@ -965,7 +1161,7 @@ async def upsert_dict_entries(
             meta = parse_metadata(metadata_path)
             meta["version"] = ver
             meta["updated_at"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000+00:00")
-            metadata_path.write_text(json.dumps(meta, ensure_ascii=False, indent=2), encoding="utf-8")
+            metadata_path.write_bytes(orjson.dumps(meta, option=orjson.OPT_INDENT_2))
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to update metadata.json: {e}")
 
@@ -974,32 +1170,26 @@ async def upsert_dict_entries(
 
 # ============ Update API ============
 
-async def _get_history_between(dict_id: str, from_ver: int, to_ver: int) -> list[dict]:
-    conn = get_db()
-    cursor = await conn.execute(
-        """SELECT DISTINCT version, message
-           FROM version_history
-           WHERE dict_id = ? AND version > ? AND version <= ?
-           ORDER BY version ASC""",
-        (dict_id, from_ver, to_ver)
-    )
-    rows = await cursor.fetchall()
-    await cursor.close()
-    return [{"v": r["version"], "m": r["message"]} for r in rows]
-
+async def _compute_update_between(dict_id: str, from_ver: int, to_ver: int) -> tuple[list[dict], dict[str, list]]:
+    """
+    一次查询 (from_ver, to_ver] 范围内的版本记录，同时得出版本历史和需要下载的文件/词条
 
-async def _compute_required_files(dict_id: str, from_ver: int, to_ver: int) -> dict[str, list]:
+    Returns:
+        (history, required)
+    """
     conn = get_db()
     cursor = await conn.execute(
-        """SELECT version, change_type, file_name, entry_id
+        """SELECT version, message, change_type, file_name, entry_id
            FROM version_history
            WHERE dict_id = ? AND version > ? AND version <= ?
-           ORDER BY version ASC""",
+           ORDER BY version ASC, id ASC""",
         (dict_id, from_ver, to_ver)
     )
     rows = await cursor.fetchall()
     await cursor.close()
 
+    history: list[dict] = []
+    seen_history: set[tuple[int, str]] = set()
     files_needed: set[str] = set()
     entries_needed: dict[int, None] = {}
     entries_deleted: dict[int, None] = {}
@@ -1007,6 +1197,12 @@ async def _compute_required_files(dict_id: str, from_ver: int, to_ver: int) -> d
     db_file_updated = False
 
     for r in rows:
+        # next_version 不加锁，并发写入可能让同一版本带有不同 message 且交错出现，需按 (v, m) 去重
+        version_message = (r["version"], r["message"])
+        if version_message not in seen_history:
+            seen_history.add(version_message)
+            history.append({"v": r["version"], "m": r["message"]})
+
         if r["change_type"] == "file":
             files_needed.add(r["file_name"])
             if r["file_name"] == "dictionary.db":
@@ -1034,7 +1230,7 @@ async def _compute_required_files(dict_id: str, from_ver: int, to_ver: int) -> d
                 entries_needed.pop(eid, None)
                 entries_state.pop(eid, None)
 
-    return {
+    return history, {
         "files": sorted(files_needed),
         "entries": list(entries_needed.keys()),
         "deleted_entries": list(entries_deleted.keys()),
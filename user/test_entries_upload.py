@@ -0,0 +1,51 @@
+"""
+parse_entries_upload 的测试：完整上传正常解析，截断的 .zst 上传整体拒绝
+
+运行: python -m unittest test_entries_upload（在 user 目录下）
+"""
+
+import io
+import os
+import tempfile
+import unittest
+
+os.environ.setdefault("JWT_SECRET", "test-secret")
+os.environ.setdefault("DATA_PATH", tempfile.mkdtemp(prefix="easydict-test-"))
+
+import zstandard as zstd
+
+import main
+
+ENTRY_COUNT = 20000
+
+
+def _entries_bytes() -> bytes:
+    # 每行 64 字节
+    return b"".join((b'{"entry_id": %d}' % i).ljust(63) + b"\n" for i in range(ENTRY_COUNT))
+
+
+class ParseEntriesUploadTest(unittest.TestCase):
+    def setUp(self):
+        self.data = zstd.ZstdCompressor(level=3).compress(_entries_bytes())
+
+    def test_complete_upload(self):
+        upserts, deletes = main.parse_entries_upload(io.BytesIO(self.data))
+        self.assertEqual(len(upserts), ENTRY_COUNT)
+        self.assertEqual(deletes, [])
+
+    def test_multiple_frames(self):
+        upserts, _ = main.parse_entries_upload(io.BytesIO(self.data + self.data))
+        self.assertEqual(len(upserts), 2 * ENTRY_COUNT)
+
+    def test_truncated_upload_rejected(self):
+        for size in (len(self.data) * 2 // 3, len(self.data) - 1):
+            with self.subTest(size=size), self.assertRaises(zstd.ZstdError):
+                main.parse_entries_upload(io.BytesIO(self.data[:size]))
+
+    def test_truncated_second_frame_rejected(self):
+        with self.assertRaises(zstd.ZstdError):
+            main.parse_entries_upload(io.BytesIO(self.data + self.data[:len(self.data) // 2]))
+
+
+if __name__ == "__main__":
+    unittest.main()